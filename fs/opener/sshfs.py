@@ -34,6 +34,7 @@ class SSHOpener(Opener):
 
         params = configparser.ConfigParser()
         params.read_dict({'sshfs':getattr(parse_result, 'params', {})})
+        lazy = params.getboolean('sshfs', 'lazy', fallback=False)
 
         ssh_fs = SSHFS(
             ssh_host,
@@ -47,12 +48,28 @@ class SSHOpener(Opener):
             config_path=\
                 params.get('sshfs', 'config_path', fallback='~/.ssh/config'),
             exec_timeout=params.getint('sshfs', 'timeout', fallback=None),
+            pool_size=params.getint('sshfs', 'pool_size', fallback=4),
+            pool_idle_timeout=\
+                params.getint('sshfs', 'pool_idle_timeout', fallback=60),
+            pool_max_sessions=\
+                params.getint('sshfs', 'pool_max_sessions', fallback=8),
+            names_ttl=params.getint('sshfs', 'names_ttl', fallback=60),
+            cache_ttl=params.getint('sshfs', 'cache_ttl', fallback=0),
+            cache_size=params.getint('sshfs', 'cache_size', fallback=1024),
+            share_transport=\
+                params.getboolean('sshfs', 'share_transport', fallback=False),
+            lazy=lazy,
+            retries=params.getint('sshfs', 'retries', fallback=3),
+            retry_delay=params.getfloat('sshfs', 'retry_delay', fallback=1),
         )
 
         try:
             if dir_path:
                 if create:
                     ssh_fs.makedirs(dir_path, recreate=True)
+                elif lazy:
+                    # checking the directory exists would require connecting
+                    return ClosingSubFS(ssh_fs, dir_path)
                 return ssh_fs.opendir(dir_path, factory=ClosingSubFS)
             else:
                 return ssh_fs
@@ -4,8 +4,13 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import sys
+
 from .sshfs import SSHFS
 
+if sys.version_info >= (3, 5):
+    from .aio import AsyncSSHFS, AsyncSSHFile
+
 __license__ = "LGPLv2+"
 __copyright__ = "Copyright (c) 2017-2021 Martin Larralde"
 __author__ = "Martin Larralde <martin.larralde@embl.de>"
@@ -0,0 +1,728 @@
+# coding: utf-8
+"""Implementation of `AsyncSSHFS`.
+
+This module uses the ``async``/``await`` syntax, and as such is only
+available on Python 3.5 and later.
+"""
+from __future__ import unicode_literals
+from __future__ import absolute_import
+
+import asyncio
+import collections
+import functools
+import io
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+from paramiko.message import Message
+from paramiko.sftp import (
+    CMD_ATTRS,
+    CMD_CLOSE,
+    CMD_DATA,
+    CMD_FSTAT,
+    CMD_HANDLE,
+    CMD_MKDIR,
+    CMD_NAME,
+    CMD_OPEN,
+    CMD_OPENDIR,
+    CMD_READ,
+    CMD_READDIR,
+    CMD_REMOVE,
+    CMD_STAT,
+    CMD_WRITE,
+    SFTP_FLAG_APPEND,
+    SFTP_FLAG_CREATE,
+    SFTP_FLAG_EXCL,
+    SFTP_FLAG_READ,
+    SFTP_FLAG_TRUNC,
+    SFTP_FLAG_WRITE,
+    SFTPError,
+    int64,
+)
+
+from .. import errors
+from ..info import Info
+from ..mode import Mode
+from ..path import basename, join
+from ..permissions import Permissions
+
+from .error_tools import convert_sshfs_errors
+from .sftp import SFTPClient
+from .sshfs import SSHFS
+from .transfer import DEFAULT_CHUNK_SIZE
+
+# the maximum size of the data read or written by a single request
+_REQUEST_SIZE = 32768
+# the maximum number of requests in flight for a single read or write
+_FILE_WINDOW = 32
+
+
+def _open_flags(mode):
+    flags = 0
+    if mode.reading:
+        flags |= SFTP_FLAG_READ
+    if mode.writing:
+        flags |= SFTP_FLAG_WRITE
+    if mode.create:
+        flags |= SFTP_FLAG_CREATE
+    if mode.truncate:
+        flags |= SFTP_FLAG_TRUNC
+    if mode.appending:
+        flags |= SFTP_FLAG_APPEND
+    if mode.exclusive:
+        flags |= SFTP_FLAG_EXCL
+    return flags
+
+
+class _AsyncSession(object):
+    """An SFTP session waiting for the responses to its requests in a loop.
+
+    Requests are sent by a background thread, since sending blocks while
+    the window of the channel is full, and another background thread
+    reads the responses and hands them over to the coroutines waiting for
+    them, so that any number of requests can be in flight without a thread
+    waiting for each of them, and without blocking the event loop.
+
+    Arguments:
+        sftp (fs.sshfs.sftp.SFTPClient): The session to send requests over.
+            It must not be used by anything else.
+        loop (asyncio.AbstractEventLoop): The loop running the coroutines.
+        window (int): The maximum number of requests in flight.
+
+    """
+
+    def __init__(self, sftp, loop, window=256):
+        self.sftp = sftp
+        self._loop = loop
+        self._window = asyncio.Semaphore(window)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._early = {}
+        self._error = None
+        # a single thread keeps the requests in the order they were sent
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._reader = threading.Thread(target=self._read_responses)
+        self._reader.daemon = True
+        self._reader.start()
+
+    @property
+    def closed(self):
+        return self._error is not None or self.sftp.sock.closed
+
+    @property
+    def load(self):
+        return len(self._pending)
+
+    def _read_responses(self):
+        try:
+            while True:
+                t, data = self.sftp._read_packet()
+                msg = Message(data)
+                num = msg.get_int()
+                with self._lock:
+                    future = self._pending.pop(num, None)
+                    if future is None:
+                        # the response arrived before the request was registered
+                        self._early[num] = (t, msg)
+                        continue
+                self._loop.call_soon_threadsafe(self._resolve, future, t, msg)
+        except Exception as err:
+            with self._lock:
+                self._error = err
+                pending, self._pending = self._pending, {}
+            try:
+                for future in pending.values():
+                    self._loop.call_soon_threadsafe(self._fail, future)
+            except RuntimeError:
+                pass  # the event loop was closed
+
+    @staticmethod
+    def _resolve(future, t, msg):
+        if not future.done():
+            future.set_result((t, msg))
+
+    @staticmethod
+    def _fail(future):
+        if not future.done():
+            future.set_exception(paramiko.SSHException("SFTP session closed"))
+
+    async def request(self, t, *args):
+        """Send a request and wait for its response.
+
+        Returns:
+            (int, paramiko.Message): the type and the content of the
+            response, positioned after the request number.
+
+        Raises:
+            IOError: when the server answered with an error status.
+            EOFError: when the server answered with an EOF status.
+            paramiko.SSHException: when the session was closed.
+
+        """
+        async with self._window:
+            future = self._loop.create_future()
+            num = await self._loop.run_in_executor(self._writer, self._send, t, args)
+            with self._lock:
+                response = self._early.pop(num, None)
+                if response is None:
+                    if self._error is not None:
+                        raise paramiko.SSHException("SFTP session closed")
+                    self._pending[num] = future
+            if response is None:
+                response = await future
+        return self.sftp.check_status(*response)
+
+    def _send(self, t, args):
+        num = self.sftp.send(t, *args)
+        # responses are read by our thread, not by `paramiko`
+        self.sftp._expecting.pop(num, None)
+        return num
+
+    async def close_handle(self, handle):
+        """Close a file or directory handle, ignoring errors.
+        """
+        try:
+            await self.request(CMD_CLOSE, handle)
+        except (IOError, EOFError, paramiko.SSHException):
+            pass
+
+    def close(self):
+        """Close the session, failing the requests still in flight.
+        """
+        self.sftp.close()
+        self._writer.shutdown(wait=False)
+
+
+class AsyncSSHFile(object):
+    """An asynchronous handle on a remote file.
+
+    Reads and writes larger than a single SFTP request are split in
+    several requests sent concurrently, with at most 32 of them in flight
+    for each read or write. Instances are created with
+    `AsyncSSHFS.openbin`, and can be used as asynchronous context managers.
+    """
+
+    def __init__(self, session, handle, path, mode, on_close=None):  # noqa: D107
+        self._session = session
+        self._handle = handle
+        self._path = path
+        self._mode = mode
+        self._position = 0
+        self._on_close = on_close
+        self.closed = False
+
+    @property
+    def mode(self):
+        return self._mode.to_platform_bin()
+
+    async def __aenter__(self):  # noqa: D105
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):  # noqa: D105
+        await self.close()
+
+    def _check(self, operation=None):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        if operation == "read" and not self._mode.reading:
+            raise io.UnsupportedOperation("File not open for reading")
+        if operation == "write" and not self._mode.writing:
+            raise io.UnsupportedOperation("File not open for writing")
+
+    async def _size(self):
+        t, msg = await self._session.request(CMD_FSTAT, self._handle)
+        if t != CMD_ATTRS:
+            raise SFTPError("Expected attributes")
+        return paramiko.SFTPAttributes._from_msg(msg).st_size
+
+    async def _read_request(self, offset, length):
+        try:
+            t, msg = await self._session.request(
+                CMD_READ, self._handle, int64(offset), length)
+        except EOFError:
+            return b""
+        if t != CMD_DATA:
+            raise SFTPError("Expected data")
+        return msg.get_string()
+
+    def tell(self):
+        """Get the current position in the file.
+        """
+        self._check()
+        return self._position
+
+    async def seek(self, offset, whence=io.SEEK_SET):
+        """Change the current position in the file.
+
+        Returns:
+            int: the new position in the file.
+        """
+        self._check()
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            with convert_sshfs_errors("seek", self._path):
+                offset += await self._size()
+        elif whence != io.SEEK_SET:
+            raise ValueError("invalid whence ({!r})".format(whence))
+        if offset < 0:
+            raise ValueError("negative seek position {}".format(offset))
+        self._position = offset
+        return offset
+
+    async def read(self, size=-1):
+        """Read at most ``size`` bytes from the file.
+
+        All the requests needed to read ``size`` bytes are sent at once,
+        so reading a large number of bytes past the end of the file is
+        wasteful. Reading with a negative ``size`` gets the size of the
+        file first, and reads until its end.
+
+        Returns:
+            bytes: the data read, which is empty at the end of the file.
+        """
+        self._check("read")
+        with convert_sshfs_errors("read", self._path):
+            if size is None or size < 0:
+                size = max(0, await self._size() - self._position)
+            data = bytearray()
+            eof = False
+            while len(data) < size and not eof:
+                start = self._position + len(data)
+                stop = self._position + size
+                ranges = [
+                    (offset, min(_REQUEST_SIZE, stop - offset))
+                    for offset in range(start, stop, _REQUEST_SIZE)
+                ]
+                limit = asyncio.Semaphore(_FILE_WINDOW)
+
+                async def read_range(offset, length):
+                    async with limit:
+                        return await self._read_request(offset, length)
+
+                chunks = await asyncio.gather(*(
+                    read_range(offset, length) for offset, length in ranges
+                ))
+                for (_, length), chunk in zip(ranges, chunks):
+                    data += chunk
+                    if len(chunk) < length:
+                        # the following requests start after a gap, unless
+                        # the end of the file was reached
+                        eof = not chunk
+                        break
+        self._position += len(data)
+        return bytes(data)
+
+    async def write(self, data):
+        """Write ``data`` to the file, at the current position.
+
+        Returns:
+            int: the number of bytes written.
+        """
+        self._check("write")
+        view = memoryview(data)
+        limit = asyncio.Semaphore(_FILE_WINDOW)
+
+        async def write_range(offset):
+            # the data of a request is only copied once it can be sent
+            async with limit:
+                await self._session.request(
+                    CMD_WRITE,
+                    self._handle,
+                    int64(self._position + offset),
+                    bytes(view[offset:offset + _REQUEST_SIZE]),
+                )
+
+        with convert_sshfs_errors("write", self._path):
+            await asyncio.gather(*(
+                write_range(offset) for offset in range(0, len(view), _REQUEST_SIZE)
+            ))
+        self._position += len(view)
+        return len(view)
+
+    async def close(self):
+        """Close the file, flushing it on the server.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            with convert_sshfs_errors("close", self._path):
+                await self._session.request(CMD_CLOSE, self._handle)
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+
+
+class AsyncSSHFS(object):
+    """An asynchronous SSH filesystem using SFTP.
+
+    The main methods of `SSHFS` are available as coroutines, which do not
+    block a thread while waiting for the server: requests are multiplexed
+    over a few SFTP sessions, each with a single thread reading responses
+    and handing them over to the event loop, so that thousands of
+    operations can be waiting on the server at once.
+
+    Arguments:
+        host (str): The remote server to connect to.
+        channels (int): The maximum number of SFTP sessions to send requests
+            over. A new session is only opened when the existing ones are
+            all waiting for responses.
+        window (int): The maximum number of requests in flight on each
+            session.
+
+    All other arguments are passed to `SSHFS`. The synchronous filesystem
+    is available as the `ssh_fs` attribute: it shares the connection, as
+    well as the caches, with the asynchronous filesystem, and can be used
+    in an executor for the methods without a coroutine counterpart. The
+    connection is only opened when the filesystem is first used.
+
+    """
+
+    def __init__(self, host, *args, channels=4, window=256, **kwargs):  # noqa: D107
+        kwargs["lazy"] = True
+        self.ssh_fs = SSHFS(host, *args, **kwargs)
+        self._channels = max(channels, 1)
+        self._window = window
+        self._sessions = []
+        self._lock = None
+
+    def __repr__(self):  # noqa: D105
+        return "AsyncSSHFS({!r})".format(self.ssh_fs)
+
+    async def __aenter__(self):  # noqa: D105
+        await self._session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):  # noqa: D105
+        await self.close()
+
+    def _open_sftp(self):
+        # connecting and negotiating the SFTP version block, so this runs
+        # in an executor; the platform is needed to make info of resources
+        client = self.ssh_fs._client
+        self.ssh_fs.platform
+        return SFTPClient.from_transport(client.get_transport())
+
+    def _pick_session(self):
+        self._sessions = [s for s in self._sessions if not s.closed]
+        if not self._sessions:
+            return None
+        session = min(self._sessions, key=lambda s: s.load)
+        if session.load == 0 or len(self._sessions) >= self._channels:
+            return session
+        if self._lock.locked():
+            # a session is being opened already
+            return session
+        return None
+
+    async def _session(self):
+        """Get the least busy session, opening a new one if needed.
+        """
+        self.ssh_fs.check()
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        session = self._pick_session()
+        if session is not None:
+            return session
+        async with self._lock:
+            session = self._pick_session()
+            busy = session is None or session.load > 0
+            if busy and len(self._sessions) < self._channels:
+                loop = asyncio.get_event_loop()
+                with convert_sshfs_errors("connect", "/"):
+                    sftp = await loop.run_in_executor(None, self._open_sftp)
+                session = _AsyncSession(sftp, loop, self._window)
+                self._sessions.append(session)
+            return session
+
+    async def _stat(self, path):
+        """Get the stat result of a resource, using the cache if possible.
+        """
+        _stat = self.ssh_fs._cache.get(path)
+        if _stat is None:
+            session = await self._session()
+            t, msg = await session.request(CMD_STAT, path)
+            if t != CMD_ATTRS:
+                raise SFTPError("Expected attributes")
+            _stat = paramiko.SFTPAttributes._from_msg(msg)
+            self.ssh_fs._cache.put(path, _stat)
+        return _stat
+
+    async def _make_infos(self, entries, namespaces):
+        """Make the info of resources from ``(name, stat_result)`` pairs.
+        """
+        def make():
+            return [
+                Info(self.ssh_fs._make_raw_info(name, _stat, namespaces))
+                for name, _stat in entries
+            ]
+        if "access" in namespaces:
+            # the names of users and groups may need to be listed
+            return await asyncio.get_event_loop().run_in_executor(None, make)
+        return make()
+
+    async def close(self):
+        """Close the sessions and the connection to the server.
+        """
+        sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        if not self.ssh_fs.isclosed():
+            await asyncio.get_event_loop().run_in_executor(None, self.ssh_fs.close)
+
+    def isclosed(self):
+        """Check if the filesystem is closed.
+        """
+        return self.ssh_fs.isclosed()
+
+    async def getinfo(self, path, namespaces=None):
+        """Get info regarding a resource.
+
+        Only the *basic*, *details*, *stat* and *access* namespaces are
+        supported.
+
+        Raises:
+            fs.errors.ResourceNotFound: If ``path`` does not exist.
+
+        """
+        namespaces = namespaces or ()
+        _path = self.ssh_fs.validatepath(path)
+        with convert_sshfs_errors("getinfo", path):
+            _stat = await self._stat(_path)
+        infos = await self._make_infos([(basename(_path), _stat)], namespaces)
+        return infos[0]
+
+    async def exists(self, path):
+        """Check if a resource exists.
+        """
+        try:
+            await self.getinfo(path)
+        except errors.ResourceNotFound:
+            return False
+        return True
+
+    async def isdir(self, path):
+        """Check if a path maps to an existing directory.
+        """
+        try:
+            return (await self.getinfo(path)).is_dir
+        except errors.ResourceNotFound:
+            return False
+
+    async def isfile(self, path):
+        """Check if a path maps to an existing file.
+        """
+        try:
+            return not (await self.getinfo(path)).is_dir
+        except errors.ResourceNotFound:
+            return False
+
+    async def scandir(self, path, namespaces=None, read_ahead=4):
+        """Get the info of all the resources in a directory.
+
+        Entries are listed in batches, with up to ``read_ahead`` batches
+        requested in advance.
+
+        Returns:
+            list: the `~fs.info.Info` of each resource in the directory.
+
+        Raises:
+            fs.errors.DirectoryExpected: If ``path`` is not a directory.
+            fs.errors.ResourceNotFound: If ``path`` does not exist.
+
+        """
+        namespaces = namespaces or ()
+        _path = self.ssh_fs.validatepath(path)
+        entries = []
+        try:
+            with convert_sshfs_errors("scandir", path, directory=True):
+                session = await self._session()
+                t, msg = await session.request(CMD_OPENDIR, _path)
+                if t != CMD_HANDLE:
+                    raise SFTPError("Expected handle")
+                handle = msg.get_binary()
+                pending = collections.deque()
+                try:
+                    while True:
+                        while len(pending) < read_ahead:
+                            request = session.request(CMD_READDIR, handle)
+                            pending.append(asyncio.ensure_future(request))
+                        try:
+                            t, msg = await pending.popleft()
+                        except EOFError:
+                            break
+                        if t != CMD_NAME:
+                            raise SFTPError("Expected name response")
+                        for _ in range(msg.get_int()):
+                            filename = msg.get_text()
+                            longname = msg.get_text()
+                            _stat = paramiko.SFTPAttributes._from_msg(msg, filename, longname)
+                            if filename in (".", ".."):
+                                continue
+                            # directory listings do not follow symlinks
+                            if not stat.S_ISLNK(_stat.st_mode):
+                                self.ssh_fs._cache.put(join(_path, filename), _stat)
+                            entries.append((filename, _stat))
+                finally:
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    await session.close_handle(handle)
+        except errors.ResourceNotFound:
+            # the server does not tell missing directories from files
+            if await self.isfile(_path):
+                raise errors.DirectoryExpected(path) from None
+            raise
+        return await self._make_infos(entries, namespaces)
+
+    async def listdir(self, path):
+        """Get a list of the resource names in a directory.
+        """
+        return [info.name for info in await self.scandir(path)]
+
+    async def makedir(self, path, permissions=None, recreate=False):
+        """Make a directory.
+
+        Raises:
+            fs.errors.DirectoryExists: If the path already exists, unless
+                ``recreate`` is `True` and the path is a directory.
+            fs.errors.ResourceNotFound: If the path is not found.
+
+        """
+        _permissions = permissions or Permissions(mode=0o755)
+        _path = self.ssh_fs.validatepath(path)
+        try:
+            info = await self.getinfo(_path)
+        except errors.ResourceNotFound:
+            attr = paramiko.SFTPAttributes()
+            attr.st_mode = _permissions.mode
+            with convert_sshfs_errors("makedir", path):
+                session = await self._session()
+                await session.request(CMD_MKDIR, _path, attr)
+            self.ssh_fs._cache.invalidate(_path)
+        else:
+            if (info.is_dir and not recreate) or info.is_file:
+                raise errors.DirectoryExists(path)
+
+    async def remove(self, path):
+        """Remove a file.
+
+        Raises:
+            fs.errors.FileExpected: If the path is a directory.
+            fs.errors.ResourceNotFound: If the path does not exist.
+
+        """
+        _path = self.ssh_fs.validatepath(path)
+        # NB: this will raise ResourceNotFound
+        if (await self.getinfo(_path)).is_dir:
+            raise errors.FileExpected(path)
+        try:
+            with convert_sshfs_errors("remove", path):
+                session = await self._session()
+                await session.request(CMD_REMOVE, _path)
+        finally:
+            self.ssh_fs._cache.invalidate(_path)
+
+    async def openbin(self, path, mode="r"):
+        """Open a binary file.
+
+        Returns:
+            AsyncSSHFile: an asynchronous file handle, bound to a single
+            SFTP session.
+
+        Raises:
+            fs.errors.FileExpected: If the path is not a file.
+            fs.errors.FileExists: If the file exists, and *exclusive mode*
+                is specified (``x`` in the mode).
+            fs.errors.ResourceNotFound: If the path does not exist.
+
+        """
+        _mode = Mode(mode)
+        _mode.validate_bin()
+        _path = self.ssh_fs.validatepath(path)
+        try:
+            info = await self.getinfo(_path)
+        except errors.ResourceNotFound:
+            if not _mode.create:
+                raise
+        else:
+            if _mode.exclusive:
+                raise errors.FileExists(path)
+            if info.is_dir:
+                raise errors.FileExpected(path)
+
+        on_close = None
+        if _mode.writing:
+            self.ssh_fs._cache.invalidate(_path)
+            on_close = functools.partial(self.ssh_fs._cache.invalidate, _path)
+        with convert_sshfs_errors("openbin", path):
+            session = await self._session()
+            t, msg = await session.request(
+                CMD_OPEN, _path, _open_flags(_mode), paramiko.SFTPAttributes())
+            if t != CMD_HANDLE:
+                raise SFTPError("Expected handle")
+        handle = AsyncSSHFile(session, msg.get_binary(), path, _mode, on_close)
+        if _mode.appending:
+            await handle.seek(0, io.SEEK_END)
+        return handle
+
+    async def readbytes(self, path):
+        """Get the contents of a file as bytes.
+        """
+        async with await self.openbin(path) as remote:
+            return await remote.read()
+
+    async def writebytes(self, path, contents):
+        """Copy binary data to a file, replacing its previous contents.
+        """
+        async with await self.openbin(path, "wb") as remote:
+            await remote.write(contents)
+
+    async def download(self, path, file, chunk_size=None):
+        """Copy a file from the filesystem to a file-like object.
+
+        The file is downloaded in chunks of ``chunk_size`` bytes, each of
+        them read with concurrent requests.
+
+        Arguments:
+            path (str): Path to a resource on the filesystem.
+            file (io.IOBase): A file-like object open for writing in binary
+                mode.
+            chunk_size (int, optional): The number of bytes read before
+                being written to ``file``, or `None` to use a default of
+                4 MiB.
+
+        """
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        async with await self.openbin(path) as remote:
+            with convert_sshfs_errors("download", path):
+                remaining = await remote._size()
+            while remaining > 0:
+                data = await remote.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                file.write(data)
+                remaining -= len(data)
+
+    async def upload(self, path, file, chunk_size=None):
+        """Set a file to the contents of a binary file object.
+
+        The file is uploaded in chunks of ``chunk_size`` bytes, each of
+        them written with concurrent requests.
+
+        Arguments:
+            path (str): A path on the filesystem.
+            file (io.IOBase): A file-like object open for reading in binary
+                mode.
+            chunk_size (int, optional): The number of bytes read from
+                ``file`` at once, or `None` to use a default of 4 MiB.
+
+        """
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        async with await self.openbin(path, "wb") as remote:
+            while True:
+                data = file.read(chunk_size)
+                if not data:
+                    break
+                await remote.write(data)
@@ -0,0 +1,86 @@
+# coding: utf-8
+"""Conversion between directory trees and tar streams.
+"""
+from __future__ import unicode_literals
+from __future__ import absolute_import
+
+import tarfile
+import time
+
+from ..enums import ResourceType
+from ..path import abspath, frombase, join, normpath, relpath
+
+
+def write_tree(src_fs, src_path, fileobj, compression=None):
+    """Write a directory tree as a tar archive to a stream.
+
+    Only directories and regular files are archived, with their
+    modification time and, when ``src_fs`` provides them, permissions.
+
+    Arguments:
+        src_fs (fs.base.FS): The filesystem to archive files from.
+        src_path (str): The path to the directory to archive.
+        fileobj (io.IOBase): A file-like object open for writing in
+            binary mode, which does not need to be seekable.
+        compression (str, optional): The compression of the archive,
+            either ``"gz"``, ``"bz2"`` or ``"xz"``, or `None`.
+
+    """
+    base = abspath(normpath(src_path))
+    mode = "w|{}".format(compression or "")
+    with tarfile.open(fileobj=fileobj, mode=mode, encoding="utf-8") as tar:
+        for path, info in src_fs.walk.info(base, namespaces=["details", "access"]):
+            tarinfo = tarfile.TarInfo(relpath(frombase(base, path)))
+            modified = info.raw["details"].get("modified")
+            tarinfo.mtime = int(time.time() if modified is None else modified)
+            permissions = info.permissions if info.has_namespace("access") else None
+            if info.is_dir:
+                tarinfo.type = tarfile.DIRTYPE
+                tarinfo.mode = 0o755 if permissions is None else permissions.mode
+                tar.addfile(tarinfo)
+            elif info.type == ResourceType.file:
+                tarinfo.size = info.size
+                tarinfo.mode = 0o644 if permissions is None else permissions.mode
+                with src_fs.openbin(path) as src_file:
+                    tar.addfile(tarinfo, src_file)
+
+
+def read_tree(fileobj, dst_fs, dst_path, compression=None):
+    """Extract a tar archive from a stream into a directory.
+
+    Links and special files are skipped, since filesystems cannot create
+    them. Member names are sanitized, so that no resource is ever created
+    outside of ``dst_path``.
+
+    Arguments:
+        fileobj (io.IOBase): A file-like object open for reading in
+            binary mode, which does not need to be seekable.
+        dst_fs (fs.base.FS): The filesystem to extract files to.
+        dst_path (str): The path to the destination directory, created
+            if it does not exist.
+        compression (str, optional): The compression of the archive,
+            either ``"gz"``, ``"bz2"`` or ``"xz"``, or `None`.
+
+    Raises:
+        fs.errors.IllegalBackReference: If a member of the archive
+            refers to a parent of the archived directory.
+
+    """
+    dst_fs.makedirs(dst_path, recreate=True)
+    directories = []
+    mode = "r|{}".format(compression or "")
+    with tarfile.open(fileobj=fileobj, mode=mode, encoding="utf-8") as tar:
+        for member in tar:
+            name = relpath(normpath(member.name))
+            if not name:
+                continue
+            path = join(dst_path, name)
+            if member.isdir():
+                dst_fs.makedir(path, recreate=True)
+                directories.append((path, member.mtime))
+            elif member.isfile():
+                dst_fs.upload(path, tar.extractfile(member))
+                dst_fs.setinfo(path, {"details": {"modified": member.mtime}})
+    # extracting files changes the modification time of their directory
+    for path, mtime in reversed(directories):
+        dst_fs.setinfo(path, {"details": {"modified": mtime}})
@@ -0,0 +1,228 @@
+# coding: utf-8
+"""Implementation of `SSHBatch`.
+"""
+from __future__ import unicode_literals
+from __future__ import absolute_import
+
+import six
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import errors
+from ..path import iteratepath
+from ..permissions import Permissions
+
+from .error_tools import convert_sshfs_errors
+
+
+class SSHBatch(object):
+    """Run operations on many resources of an `SSHFS` concurrently.
+
+    Items are spread across ``workers`` threads, each of them checking out
+    an SFTP session from the pool of the filesystem and using it for all
+    the operations it runs. Every method takes a list of items and returns
+    a list with the outcome of each item, in the same order: the value
+    returned by the operation, or the exception it raised, so that a
+    failure does not prevent the other items from being processed.
+
+    Arguments:
+        fs (SSHFS): The filesystem to run operations on.
+        workers (int): The number of operations run concurrently, at
+            most one less than the ``pool_max_sessions`` of the
+            filesystem.
+
+    """
+
+    def __init__(self, fs, workers=4):  # noqa: D107
+        self._fs = fs
+        self._workers = max(workers, 1)
+
+    def map(self, func, items):
+        """Call ``func`` on each item concurrently.
+
+        Returns:
+            list: the value returned by ``func`` for each item, or the
+            exception it raised.
+        """
+        return self._run(func, items, pinned=True)
+
+    def _run(self, func, items, pinned):
+        items = list(items)
+        results = [None] * len(items)
+        queue = six.moves.queue.Queue()
+        for index, item in enumerate(items):
+            queue.put((index, item))
+
+        def consume():
+            while True:
+                try:
+                    index, item = queue.get_nowait()
+                except six.moves.queue.Empty:
+                    return
+                try:
+                    results[index] = func(item)
+                except Exception as err:
+                    results[index] = err
+
+        def worker():
+            if pinned:
+                with self._fs._pinned_session():
+                    consume()
+            else:
+                consume()
+
+        count = min(self._workers, len(items))
+        # each worker holds a single session at a time, so that workers
+        # never wait for each other when the pool is at its limit
+        max_sessions = self._fs._pool.max_sessions if count > 0 else 0
+        if max_sessions:
+            # leave a session for the one shared by directory listings
+            count = min(count, max(max_sessions - 1, 1))
+        if count > 0:
+            with ThreadPoolExecutor(max_workers=count) as executor:
+                futures = [executor.submit(worker) for _ in six.moves.range(count)]
+                for future in futures:
+                    future.result()
+        return results
+
+    def remove(self, paths):
+        """Remove several files.
+
+        Unlike `SSHFS.remove`, files are removed without checking their
+        type first, which is only done to report the right error when the
+        removal fails.
+
+        Returns:
+            list: `None` for each removed file, or the error that
+            `SSHFS.remove` would have raised.
+        """
+        fs = self._fs
+
+        def remove(path):
+            _path = fs.validatepath(path)
+            try:
+                with convert_sshfs_errors('remove', path):
+                    try:
+                        with fs._session() as sftp:
+                            sftp.remove(_path)
+                    except IOError:
+                        fs.remove(path)
+            finally:
+                fs._cache.invalidate(_path)
+
+        return self.map(remove, paths)
+
+    def makedir(self, paths, permissions=None, recreate=False):
+        """Make several directories.
+
+        Directories are created one depth level at a time, so that the
+        parents of a directory can be part of the same batch. Unlike
+        `SSHFS.makedir`, the paths are only checked when the creation of
+        a directory fails.
+
+        Returns:
+            list: `None` for each directory, or the error that
+            `SSHFS.makedir` would have raised.
+        """
+        fs = self._fs
+        mode = (permissions or Permissions(mode=0o755)).mode
+
+        def makedir(path):
+            _path = fs.validatepath(path)
+            try:
+                with convert_sshfs_errors('makedir', path):
+                    try:
+                        with fs._session() as sftp:
+                            sftp.mkdir(_path, mode)
+                    except IOError:
+                        fs.makedir(path, permissions, recreate)
+            finally:
+                fs._cache.invalidate(_path)
+
+        paths = list(paths)
+        results = [None] * len(paths)
+        levels = {}
+        for index, path in enumerate(paths):
+            levels.setdefault(len(iteratepath(path)), []).append(index)
+        for depth in sorted(levels):
+            indices = levels[depth]
+            outcomes = self.map(makedir, [paths[index] for index in indices])
+            for index, outcome in zip(indices, outcomes):
+                results[index] = outcome
+        return results
+
+    def setinfo(self, items):
+        """Set the info of several resources.
+
+        Arguments:
+            items (list): The ``(path, info)`` pairs to set, as with
+                `SSHFS.setinfo`.
+
+        Returns:
+            list: `None` for each resource, or the error that
+            `SSHFS.setinfo` would have raised.
+        """
+        fs = self._fs
+
+        def setinfo(item):
+            path, info = item
+            # changing the info of a missing resource fails by itself
+            if not fs._setinfo(path, info) and not fs.exists(path):
+                raise errors.ResourceNotFound(path)
+
+        return self.map(setinfo, items)
+
+    def move(self, items, overwrite=False, preserve_time=False):
+        """Move several files.
+
+        Arguments:
+            items (list): The ``(src_path, dst_path)`` pairs of the files
+                to move.
+            overwrite (bool): Set to `True` to overwrite existing files.
+            preserve_time (bool): Set to `True` to preserve the
+                modification time of the files.
+
+        Returns:
+            list: `None` for each moved file, or the error that
+            `SSHFS.move` would have raised.
+        """
+        fs = self._fs
+
+        def move(item):
+            src_path, dst_path = item
+            fs.move(src_path, dst_path, overwrite=overwrite, preserve_time=preserve_time)
+
+        return self.map(move, items)
+
+    def openbin(self, paths, func, **options):
+        """Open several files for reading, and process them concurrently.
+
+        Arguments:
+            paths (list): The paths to the files to open.
+            func (callable): A function called with each open file, and
+                whose return value is the result of the file. The file is
+                closed once the function returns.
+
+        Keyword Arguments:
+            options: The options of `SSHFS.openbin`.
+
+        Returns:
+            list: the value returned by ``func`` for each file, or the
+            error raised while opening or processing it.
+        """
+        fs = self._fs
+
+        def process(path):
+            with fs.openbin(path, 'r', **options) as handle:
+                return func(handle)
+
+        # open files use their own session, so no session is pinned
+        return self._run(process, paths, pinned=False)
+
+    def readbytes(self, paths):
+        """Get the contents of several files as bytes.
+
+        Returns:
+            list: the contents of each file, or the error raised while
+            reading it.
+        """
+        return self.openbin(paths, lambda handle: handle.read())
@@ -0,0 +1,119 @@
+# coding: utf-8
+"""Implementation of `StatCache`.
+"""
+from __future__ import unicode_literals
+from __future__ import absolute_import
+
+import collections
+import threading
+import time
+
+
+class StatCache(object):
+    """A thread-safe LRU cache of stat results with a time-to-live.
+
+    Arguments:
+        ttl (int): The number of seconds a stat result stays valid for. Set
+            to 0 to disable the cache entirely.
+        size (int): The maximum number of stat results to keep, the least
+            recently used entries being evicted first.
+
+    """
+
+    def __init__(self, ttl=0, size=1024):
+        self._ttl = ttl
+        self._size = size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Get the cached stat result of ``path``.
+
+        Returns:
+            paramiko.SFTPAttributes: the stat result, or `None` if ``path``
+            is not in the cache or its entry expired.
+        """
+        if self._ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is None:
+                return None
+            stat_result, expiry = entry
+            if time.time() >= expiry:
+                return None
+            self._entries[path] = entry
+            return stat_result
+
+    def put(self, path, stat_result):
+        """Store the stat result of ``path``.
+        """
+        if self._ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(path, None)
+            self._entries[path] = (stat_result, time.time() + self._ttl)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path, recursive=False):
+        """Remove ``path`` from the cache.
+
+        Arguments:
+            path (str): The path of the resource to forget.
+            recursive (bool): If `True`, also forget all the resources
+                located below ``path``.
+
+        """
+        if self._ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(path, None)
+            if recursive:
+                prefix = path.rstrip('/') + '/'
+                for key in [k for k in self._entries if k.startswith(prefix)]:
+                    del self._entries[key]
+
+    def clear(self):
+        """Remove all entries from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class BlockCache(object):
+    """An LRU cache of the blocks of a single file, bounded in bytes.
+
+    Arguments:
+        capacity (int): The maximum number of bytes to keep, the least
+            recently used blocks being evicted first.
+
+    """
+
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self._used = 0
+        self._blocks = collections.OrderedDict()
+
+    def __contains__(self, index):
+        return index in self._blocks
+
+    def get(self, index):
+        """Get the block at ``index``, or `None` if it is not cached.
+        """
+        data = self._blocks.pop(index, None)
+        if data is not None:
+            self._blocks[index] = data
+        return data
+
+    def put(self, index, data):
+        """Store the block at ``index``.
+        """
+        previous = self._blocks.pop(index, None)
+        if previous is not None:
+            self._used -= len(previous)
+        self._blocks[index] = data
+        self._used += len(data)
+        while self._used > self._capacity and self._blocks:
+            _, evicted = self._blocks.popitem(last=False)
+            self._used -= len(evicted)
@@ -8,6 +8,7 @@ import errno
 import sys
 
 import six
+import paramiko
 
 from .. import errors
 
@@ -68,6 +69,18 @@ class _ConvertSSHFSErrors(object):
                 ),
                 traceback
             )
+        elif exc_type and issubclass(exc_type, (paramiko.SSHException, EOFError)):
+            # the transport was closed or broke during the operation
+            six.reraise(
+                errors.RemoteConnectionError,
+                errors.RemoteConnectionError(
+                    self._path,
+                    exc=exc_value,
+                    msg="connection lost during {} on '{}'".format(
+                        self._opname, self._path)
+                ),
+                traceback
+            )
 
 # Stops linter complaining about invalid class name
 convert_sshfs_errors = _ConvertSSHFSErrors
@@ -4,43 +4,550 @@
 from __future__ import unicode_literals
 from __future__ import absolute_import
 
+import collections
 import io
 
+import six
+from paramiko.sftp import CMD_READ, CMD_WRITE, int64
+
 from ..iotools import RawWrapper
+from .cache import BlockCache
+
+#: The default number of bytes kept in flight by a prefetch window.
+_DEFAULT_WINDOW = 4 * 1024 * 1024
+
+
+def _byte_view(data):
+    """Get a flat memoryview of bytes over a buffer, without copying it.
+    """
+    view = memoryview(data)
+    if six.PY3 and (view.ndim != 1 or view.itemsize != 1):
+        view = view.cast('B')
+    return view
+
+
+class _ReadWindow(object):
+    """Keep a bounded window of read requests in flight ahead of a reader.
+
+    Arguments:
+        handle (paramiko.SFTPFile): The remote file handle to read from.
+        window (int): The maximum number of bytes requested but not yet
+            consumed.
+        start (int): The offset the window may start at.
+        stop (int, optional): The offset the window may not go beyond, or
+            `None` to read until the end of the file.
+
+    """
+
+    def __init__(self, handle, window, start=0, stop=None):
+        self._handle = handle
+        self._window = window
+        self._start = start
+        self._stop = stop
+        self._pending = collections.deque()
+        self._requested = 0
+        self._next = None
+        self._data = b''
+        self._offset = None
+        self.eof = False
+
+    def covers(self, pos):
+        """Check whether ``pos`` is within the range of the window.
+        """
+        return self._start <= pos and (self._stop is None or pos < self._stop)
+
+    def cancel(self):
+        """Wait for the responses of all requests in flight and discard them.
+        """
+        while self._pending:
+            self._handle.sftp._try_receive(self._pending.popleft()[2])
+        self._requested = 0
+
+    def _fill(self):
+        sftp, chunk_size = self._handle.sftp, self._handle.MAX_REQUEST_SIZE
+        while self._requested < self._window:
+            if self._stop is not None and self._next >= self._stop:
+                break
+            length = chunk_size
+            if self._stop is not None:
+                length = min(length, self._stop - self._next)
+            num = sftp.send(CMD_READ, self._handle.handle, int64(self._next), length)
+            self._pending.append((self._next, length, num))
+            self._next += length
+            self._requested += length
+
+    def _receive(self):
+        self._fill()
+        if not self._pending:
+            return False
+        offset, length, num = self._pending.popleft()
+        self._requested -= length
+        try:
+            data = self._handle.sftp.receive(num)[1].get_string()
+        except EOFError:
+            data = b''
+        except Exception:
+            self.cancel()
+            raise
+        if len(data) < length:
+            # the following requests are either past the end of the file,
+            # or would leave a hole after a short read
+            self.cancel()
+            self._next = offset + len(data)
+            if not data:
+                self._stop, self.eof = offset, True
+        self._data, self._offset = data, offset
+        return bool(data)
+
+    def pieces(self, pos, size=None, line=False):
+        """Get views over the next ``size`` bytes starting at ``pos``.
+
+        Arguments:
+            pos (int): The offset to read from.
+            size (int, optional): The number of bytes to read, or `None` to
+                read until the end of the range.
+            line (bool): Set to `True` to stop after the first newline.
+
+        Returns:
+            list: a list of `memoryview` objects over the data.
+
+        """
+        if self._offset is None or not self._offset <= pos <= self._offset + len(self._data):
+            self.cancel()
+            self._data, self._offset, self._next = b'', pos, pos
+        pieces = []
+        while size is None or size > 0:
+            if pos == self._offset + len(self._data) and not self._receive():
+                break
+            start = pos - self._offset
+            end = len(self._data) if size is None else min(len(self._data), start + size)
+            if line:
+                newline = self._data.find(b'\n', start, end)
+                if newline >= 0:
+                    end = newline + 1
+            pieces.append(memoryview(self._data)[start:end])
+            pos += end - start
+            if size is not None:
+                size -= end - start
+            if line and newline >= 0:
+                break
+        return pieces
+
+
+class _WriteBehind(object):
+    """Coalesce writes into full-sized requests sent without waiting.
+
+    Arguments:
+        handle (paramiko.SFTPFile): The remote file handle to write to.
+        limit (int): The maximum number of bytes sent to the server but
+            not yet acknowledged.
+
+    """
+
+    def __init__(self, handle, limit):
+        self._handle = handle
+        self._limit = limit
+        self._buffer = bytearray()
+        self._offset = 0
+        self._pending = collections.deque()
+        self._sent = 0
+
+    def cancel(self):
+        """Wait for all acknowledgements, ignoring errors.
+        """
+        while self._pending:
+            self._handle.sftp._try_receive(self._pending.popleft()[0])
+        self._sent = 0
+
+    def _receive(self):
+        num, length = self._pending.popleft()
+        self._sent -= length
+        try:
+            self._handle.sftp.receive(num)
+        except Exception:
+            # don't leave acknowledgements behind when reporting an error
+            self.cancel()
+            raise
+
+    def _send(self, data):
+        while self._pending and self._sent + len(data) > self._limit:
+            self._receive()
+        num = self._handle.sftp.send(
+            CMD_WRITE, self._handle.handle, int64(self._offset), data)
+        self._pending.append((num, len(data)))
+        self._sent += len(data)
+        self._offset += len(data)
+
+    def _send_buffer(self):
+        if self._buffer:
+            data, self._buffer = bytes(self._buffer), bytearray()
+            self._send(data)
+
+    def write(self, pos, data):
+        """Write ``data`` at ``pos``, only sending full-sized requests.
+        """
+        if self._buffer and pos != self._offset + len(self._buffer):
+            self._send_buffer()
+        if not self._buffer:
+            self._offset = pos
+        chunk_size = self._handle.MAX_REQUEST_SIZE
+        if self._buffer:
+            missing = chunk_size - len(self._buffer)
+            self._buffer += data[:missing]
+            data = data[missing:]
+            if len(self._buffer) < chunk_size:
+                return
+            self._send_buffer()
+        while len(data) >= chunk_size:
+            self._send(data[:chunk_size])
+            data = data[chunk_size:]
+        self._buffer += data
+
+    def flush(self):
+        """Send the buffered data, and wait for all acknowledgements.
+
+        Raises:
+            IOError: the first error reported by the server, after all
+                acknowledgements have been received.
+
+        """
+        self._send_buffer()
+        while self._pending:
+            self._receive()
 
 
 class SSHFile(RawWrapper):
     """A file on a remote SSH server.
+
+    Arguments:
+        handler (paramiko.SFTPFile): The remote file handle to wrap.
+        mode (str): The mode the file was opened with.
+        pool (fs.sshfs.pool.SFTPPool, optional): The pool the SFTP session
+            of ``handler`` was checked out from, if any. The session will be
+            released to the pool once the file is closed.
+        on_close (callable, optional): A function called without arguments
+            once the file is closed.
+        block_cache (int): The maximum number of bytes of the file to keep
+            in memory to serve reads without a round trip to the server
+            (defaults to 0, which disables the cache). Only use for files
+            that are not written to while open.
+        block_size (int): The size of the aligned blocks fetched from the
+            server when the cache is enabled.
+        size (int, optional): The size of the file, if known, to avoid
+            querying it when the cache is enabled.
+        prefetch_window (int, optional): The number of bytes to keep
+            requested ahead of the position of the reader, refilled as
+            the data is consumed.
+        prefetch_range (tuple, optional): The ``(start, stop)`` byte range
+            of the file to prefetch, ``stop`` being `None` to prefetch
+            until the end of the file. Reads outside of this range are not
+            prefetched.
+        write_behind (int): The maximum number of bytes written but not yet
+            acknowledged by the server (defaults to 0, which leaves writes
+            to `paramiko.SFTPFile`). Small writes are coalesced
+            into full-sized requests, and errors are reported by the
+            following call to `flush` or `close` at the latest.
+
     """
 
-    def __init__(self, handler, mode):
+    def __init__(self, handler, mode, pool=None, on_close=None,
+                 block_cache=0, block_size=32768, size=None,
+                 prefetch_window=None, prefetch_range=None, write_behind=0):
         super(SSHFile, self).__init__(handler)
         self.mode = mode
+        self._pool = pool
+        self._on_close = on_close
+        self._blocks = None
+        if block_cache > 0:
+            self._blocks = BlockCache(block_cache)
+            self._block_size = block_size
+            self._size = handler.stat().st_size if size is None else size
+            self._max_readahead = max(1, block_cache // (4 * block_size))
+            self._readahead = 0
+            self._next = None
+        self._window = None
+        if prefetch_window is not None or prefetch_range is not None:
+            start, stop = prefetch_range or (0, None)
+            if prefetch_window is None:
+                prefetch_window = _DEFAULT_WINDOW if stop is None else stop - start
+            self._window = _ReadWindow(handler, prefetch_window, start, stop)
+        self._behind = None
+        if write_behind > 0:
+            self._behind = _WriteBehind(handler, write_behind)
+
+    def close(self):  # noqa: D102
+        if not self.closed:
+            try:
+                if self._window is not None:
+                    self._window.cancel()
+                try:
+                    self._sync()
+                finally:
+                    super(SSHFile, self).close()
+            finally:
+                if self._pool is not None:
+                    self._pool.release(self._f.sftp)
+                if self._on_close is not None:
+                    self._on_close()
 
     def seek(self, offset, whence=0):  # noqa: D102
         if whence > 2:
             raise ValueError("invalid whence "
                              "({}, should be 0, 1 or 2)".format(whence))
+        if whence == 2:
+            self._sync()
         self._f.seek(offset, whence)
         return self.tell()
 
+    def flush(self):  # noqa: D102
+        self._sync()
+        super(SSHFile, self).flush()
+
     def read(self, size=-1):  # noqa: D102
+        self._sync()
+        if self._blocks is not None:
+            return self._read_blocks(size)
+        if self._window is not None and self._window.covers(self._f.tell()):
+            return self._read_window(size)
         size = None if size==-1 else size
         return self._f.read(size)
 
     def readline(self, size=-1):  # noqa: D102
+        self._sync()
+        if self._blocks is not None:
+            return self._readline_blocks(size)
+        if self._window is not None and self._window.covers(self._f.tell()):
+            return self._read_window(size, line=True)
         size = None if size==-1 else size
         return self._f.readline(size)
 
     def truncate(self, size=None):  # noqa: D102
+        self._sync()
         size = size if size is not None else self._f.tell()  # SFTPFile doesn't support
         self._f.truncate(size)                               # truncate without argument
         return size
 
     def readlines(self, hint=-1):  # noqa: D102
+        if self._blocks is not None or self._window is not None:
+            lines, total = [], 0
+            for line in iter(self.readline, b''):
+                lines.append(line)
+                total += len(line)
+                if hint is not None and 0 < hint <= total:
+                    break
+            return lines
+        self._sync()
         hint = None if hint==-1 else hint
         return self._f.readlines(hint)
 
+    def readall(self):  # noqa: D102
+        if self._blocks is not None or self._window is not None:
+            return self.read()
+        self._sync()
+        return super(SSHFile, self).readall()
+
+    def read1(self, size=-1):  # noqa: D102
+        if self._blocks is not None or self._window is not None:
+            return self.read(size)
+        self._sync()
+        return super(SSHFile, self).read1(size)
+
+    def readinto(self, b):  # noqa: D102
+        self._sync()
+        view = _byte_view(b)
+        if self._blocks is not None:
+            count = 0
+            for block in self._read_slices(len(view)):
+                view[count:count+len(block)] = block
+                count += len(block)
+            return count
+        if self._window is not None and self._window.covers(self._f.tell()):
+            data = self._read_window(len(view))
+            view[:len(data)] = data
+            return len(data)
+        if self._f._prefetching or self._f._prefetch_data:
+            # prefetched data is already buffered in memory
+            return super(SSHFile, self).readinto(view)
+        return self._readinto_direct(view)
+
+    def readinto1(self, b):  # noqa: D102
+        return self.readinto(b)
+
+    def write(self, data):  # noqa: D102
+        try:
+            view = _byte_view(data)
+        except TypeError:
+            return super(SSHFile, self).write(data)
+        if self._behind is not None:
+            pos = self._f.tell()
+            self._behind.write(pos, view)
+            self._f.seek(pos + len(view))
+        elif self._f._flags & self._f.FLAG_LINE_BUFFERED:
+            # line buffering needs to look for newlines in the data
+            self._f.write(view.tobytes())
+        else:
+            self._f.write(view)
+        return len(view)
+
+    def __iter__(self):  # noqa: D105
+        if self._blocks is not None or self._window is not None:
+            return iter(self.readline, b'')
+        self._sync()
+        return super(SSHFile, self).__iter__()
+
     @staticmethod
     def fileno():  # noqa: D102
         raise io.UnsupportedOperation('fileno')
+
+    def _sync(self):
+        """Wait for the acknowledgement of all writes sent behind.
+        """
+        if self._behind is not None:
+            self._behind.flush()
+
+    def _fetch_blocks(self, indices):
+        """Fetch blocks from the server with pipelined requests.
+        """
+        sftp, handle, bs = self._f.sftp, self._f.handle, self._block_size
+        requests = [(CMD_READ, handle, int64(i * bs), bs) for i in indices]
+        blocks = {}
+        for index, response in zip(indices, list(sftp.pipeline(requests))):
+            if isinstance(response, EOFError):
+                data = b''
+            elif isinstance(response, Exception):
+                raise response
+            else:
+                data = response[1].get_string()
+            # servers may send less data than requested
+            while 0 < len(data) < bs and index * bs + len(data) < self._size:
+                offset = index * bs + len(data)
+                try:
+                    t, msg = sftp.receive(sftp.send(
+                        CMD_READ, handle, int64(offset), bs - len(data)))
+                except EOFError:
+                    break
+                data += msg.get_string()
+            blocks[index] = data
+            self._blocks.put(index, data)
+        return blocks
+
+    def _readinto_direct(self, view):
+        """Read into ``view`` with pipelined requests.
+
+        Each response is copied directly at its offset in ``view``, without
+        being buffered by `paramiko.SFTPFile` first.
+        """
+        f = self._f
+        if f._closed:
+            raise IOError("File is closed")
+        if not f._flags & f.FLAG_READ:
+            raise IOError("File not open for reading")
+        pos, chunk_size = f.tell(), f.MAX_REQUEST_SIZE
+        requests = (
+            (CMD_READ, f.handle, int64(pos + offset), min(chunk_size, len(view) - offset))
+            for offset in six.moves.range(0, len(view), chunk_size)
+        )
+        responses = f.sftp.pipeline(requests)
+        count = 0
+        try:
+            for response in responses:
+                if isinstance(response, EOFError):
+                    break
+                elif isinstance(response, Exception):
+                    raise response
+                data = response[1].get_string()
+                view[count:count+len(data)] = data
+                count += len(data)
+                # stop at the first short read, the data must be contiguous
+                if len(data) < chunk_size and count < len(view):
+                    break
+        finally:
+            responses.close()
+            f.seek(pos + count)
+        return count
+
+    def _read_blocks(self, size=-1):
+        """Read from the block cache, fetching missing blocks.
+        """
+        slices = self._read_slices(size)
+        if six.PY2:
+            return b''.join(block.tobytes() for block in slices)
+        return b''.join(slices)
+
+    def _read_slices(self, size=-1):
+        """Get views over the cached blocks for the next ``size`` bytes.
+        """
+        pos, bs = self._f.tell(), self._block_size
+        end = self._size if size is None or size < 0 else min(pos + size, self._size)
+        if end <= pos:
+            return []
+        first, last = pos // bs, (end - 1) // bs
+
+        # grow the readahead window on sequential reads only
+        if pos == self._next:
+            self._readahead = min(max(1, self._readahead * 2), self._max_readahead)
+        else:
+            self._readahead = 0
+        self._next = end
+
+        blocks = {i: self._blocks.get(i) for i in range(first, last + 1)}
+        missing = [i for i, data in blocks.items() if data is None]
+        if missing:
+            # readahead blocks are fetched in the same round trip
+            stop = min(last + self._readahead, (self._size - 1) // bs)
+            missing.extend(
+                i for i in range(last + 1, stop + 1) if i not in self._blocks
+            )
+            blocks.update(self._fetch_blocks(missing))
+
+        slices, count = [], 0
+        for i in range(first, last + 1):
+            block = memoryview(blocks[i])
+            start, stop = max(pos - i * bs, 0), min(end - i * bs, len(block))
+            if start >= stop:
+                break
+            slices.append(block[start:stop])
+            count += stop - start
+        self._f.seek(pos + count)
+        return slices
+
+    def _read_window(self, size=-1, line=False):
+        """Read from the prefetch window, then past its range if needed.
+        """
+        pos = self._f.tell()
+        size = None if size is None or size < 0 else size
+        pieces = self._window.pieces(pos, size, line)
+        count = sum(len(piece) for piece in pieces)
+        self._f.seek(pos + count)
+        if six.PY2:
+            data = b''.join(piece.tobytes() for piece in pieces)
+        else:
+            data = b''.join(pieces)
+        if line and data.endswith(b'\n') or count == size or self._window.eof:
+            return data
+        # the end of the prefetched range was reached
+        rest = None if size is None else size - count
+        if line:
+            return data + self._f.readline(rest)
+        return data + self._f.read(rest)
+
+    def _readline_blocks(self, size=-1):
+        """Read a line from the block cache, one block at a time.
+        """
+        line = bytearray()
+        while size is None or size < 0 or len(line) < size:
+            pos = self._f.tell()
+            chunk_size = self._block_size - pos % self._block_size
+            if size is not None and size >= 0:
+                chunk_size = min(chunk_size, size - len(line))
+            chunk = self._read_blocks(chunk_size)
+            if not chunk:
+                break
+            newline = chunk.find(b'\n')
+            if newline >= 0:
+                line += chunk[:newline + 1]
+                self._f.seek(pos + newline + 1)
+                self._next = pos + newline + 1
+                break
+            line += chunk
+        return bytes(line)
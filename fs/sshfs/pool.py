@@ -0,0 +1,179 @@
+# coding: utf-8
+"""Implementation of `SFTPPool`.
+"""
+from __future__ import unicode_literals
+from __future__ import absolute_import
+
+import collections
+import contextlib
+import threading
+import time
+
+from .. import errors
+from .sftp import SFTPClient
+
+
+class SFTPPool(object):
+    """A pool of SFTP sessions opened over the same SSH transport.
+
+    Sessions are checked out with `SFTPPool.acquire` and given back with
+    `SFTPPool.release`, so that opening a file does not require opening
+    a new channel and negotiating the SFTP version every time.
+
+    Arguments:
+        client (paramiko.SSHClient): The client used to open new sessions.
+        size (int): The maximum number of idle sessions kept in the pool.
+            Sessions released while the pool is full are closed.
+        idle_timeout (int): The number of seconds after which an idle
+            session is closed instead of being reused (set to 0 to keep
+            idle sessions forever).
+        max_sessions (int): The maximum number of sessions open at once,
+            idle or checked out, so as to stay below the ``MaxSessions``
+            limit of the server (set to 0 to open as many sessions as
+            needed).
+        wait_timeout (int): The number of seconds `SFTPPool.acquire`
+            waits for a session to be released when ``max_sessions``
+            sessions are checked out (defaults to `None`, which waits
+            forever).
+
+    """
+
+    def __init__(self, client, size=4, idle_timeout=60, max_sessions=8, wait_timeout=None):
+        self._client = client
+        self._size = size
+        self._idle_timeout = idle_timeout
+        self._max_sessions = max_sessions
+        self._wait_timeout = wait_timeout
+        self._idle = collections.deque()
+        self._lock = threading.Condition(threading.Lock())
+        self._open = 0
+        self._closed = False
+        self._shared = None
+        self._shared_lock = threading.Lock()
+
+    @property
+    def max_sessions(self):
+        """int: the maximum number of sessions open at once, or 0.
+        """
+        return self._max_sessions
+
+    def _expired(self, since, now):
+        return self._idle_timeout > 0 and now - since > self._idle_timeout
+
+    def _discard(self, sftp):
+        with self._lock:
+            self._open -= 1
+            self._lock.notify()
+        sftp.close()
+
+    def acquire(self):
+        """Check out a session from the pool, opening one if needed.
+
+        When ``max_sessions`` sessions are already checked out, this
+        waits until one of them is released.
+
+        Returns:
+            fs.sshfs.sftp.SFTPClient: an SFTP session for exclusive use by the
+            caller until it is given back with `SFTPPool.release`.
+
+        Raises:
+            fs.errors.OperationTimeout: if no session was released within
+                ``wait_timeout`` seconds.
+
+        """
+        sftp, stale = None, []
+        deadline = None
+        if self._wait_timeout is not None:
+            deadline = time.time() + self._wait_timeout
+        with self._lock:
+            while True:
+                now = time.time()
+                # expire the oldest sessions first
+                while self._idle and self._expired(self._idle[0][1], now):
+                    stale.append(self._idle.popleft()[0])
+                # reuse the most recently released session that is still alive
+                while self._idle and sftp is None:
+                    candidate, _ = self._idle.pop()
+                    if candidate.sock.closed:
+                        stale.append(candidate)
+                    else:
+                        sftp = candidate
+                self._open -= len(stale)
+                if sftp is not None:
+                    break
+                if not self._max_sessions or self._open < self._max_sessions:
+                    self._open += 1
+                    break
+                if deadline is not None and now >= deadline:
+                    raise errors.OperationTimeout(
+                        msg="no SFTP session released within {} seconds".format(
+                            self._wait_timeout))
+                self._lock.wait(None if deadline is None else deadline - now)
+        for session in stale:
+            session.close()
+        if sftp is None:
+            try:
+                sftp = SFTPClient.from_transport(self._client.get_transport())
+            except Exception:
+                with self._lock:
+                    self._open -= 1
+                    self._lock.notify()
+                raise
+        return sftp
+
+    def shared(self):
+        """Get the session shared by all the threads using the pool.
+
+        The session is opened on first use and is never checked out, so
+        it must only be used through the thread-safe `SFTPClient.send`
+        and `SFTPClient.receive` methods, which lets any number of
+        long-lived iterations, e.g. directory listings, share it.
+
+        Returns:
+            fs.sshfs.sftp.SFTPClient: the shared SFTP session.
+
+        """
+        with self._shared_lock:
+            if self._shared is None or self._shared.sock.closed:
+                if self._shared is not None:
+                    self._discard(self._shared)
+                self._shared = self.acquire()
+            return self._shared
+
+    def release(self, sftp):
+        """Give back a session previously obtained with `SFTPPool.acquire`.
+        """
+        if not sftp.sock.closed:
+            with self._lock:
+                if not self._closed and len(self._idle) < self._size:
+                    self._idle.append((sftp, time.time()))
+                    self._lock.notify()
+                    return
+        self._discard(sftp)
+
+    @contextlib.contextmanager
+    def session(self):
+        """Check out a session for the duration of a ``with`` block.
+        """
+        sftp = self.acquire()
+        try:
+            yield sftp
+        finally:
+            self.release(sftp)
+
+    def close(self):
+        """Close all idle sessions and the shared one, and stop accepting
+        released sessions.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, collections.deque()
+            self._open -= len(idle)
+            self._lock.notify_all()
+        with self._shared_lock:
+            shared, self._shared = self._shared, None
+        if shared is not None:
+            self._discard(shared)
+        for sftp, _ in idle:
+            if sftp.get_channel().get_transport().is_active():
+                sftp.close()
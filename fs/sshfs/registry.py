@@ -0,0 +1,83 @@
+# coding: utf-8
+"""Implementation of `ClientRegistry`.
+"""
+from __future__ import unicode_literals
+from __future__ import absolute_import
+
+import threading
+
+
+class ClientRegistry(object):
+    """A registry of SSH clients shared between filesystems.
+
+    Clients are reference-counted: a client is created by the first call
+    to `ClientRegistry.acquire` with a given key, reused by the following
+    ones as long as its transport is active, and closed once every
+    `ClientRegistry.acquire` has been matched by a `ClientRegistry.release`.
+    This allows opening several filesystems on the same server while only
+    connecting and authenticating once, like OpenSSH connection sharing.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _active(client):
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def _reuse(self, key):
+        entry = self._clients.get(key)
+        if entry is not None and self._active(entry[0]):
+            entry[1] += 1
+            return entry[0]
+        return None
+
+    def acquire(self, key, connect):
+        """Get the client registered for ``key``, connecting if needed.
+
+        Arguments:
+            key (tuple): The key identifying the connection, e.g. the
+                username, host, port and credentials used to connect.
+            connect (callable): A function called without arguments to
+                create a new connected `paramiko.SSHClient` when no active
+                client is registered for ``key``. It is not called while
+                holding the registry lock, so that connecting to a server
+                does not block filesystems connecting to another one.
+
+        Returns:
+            paramiko.SSHClient: a connected client.
+
+        """
+        with self._lock:
+            client = self._reuse(key)
+        if client is not None:
+            return client
+        new_client = connect()
+        with self._lock:
+            client = self._reuse(key)
+            if client is None:
+                self._clients[key] = [new_client, 1]
+                return new_client
+        # another thread connected in the meantime: use its client instead
+        new_client.close()
+        return client
+
+    def release(self, key, client):
+        """Give back a client obtained with `ClientRegistry.acquire`.
+
+        The client is closed when it is not used anymore.
+        """
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None and entry[0] is client:
+                entry[1] -= 1
+                if entry[1] > 0:
+                    return
+                del self._clients[key]
+        client.close()
+
+
+#: The registry of clients shared by `SSHFS` instances.
+client_registry = ClientRegistry()
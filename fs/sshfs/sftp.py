@@ -0,0 +1,206 @@
+# coding: utf-8
+"""Implementation of `SFTPClient`.
+"""
+from __future__ import unicode_literals
+from __future__ import absolute_import
+
+import collections
+import errno
+import struct
+import threading
+
+import paramiko
+from paramiko.message import Message
+from paramiko.sftp import (
+    CMD_CLOSE,
+    CMD_EXTENDED,
+    CMD_HANDLE,
+    CMD_INIT,
+    CMD_NAME,
+    CMD_OPENDIR,
+    CMD_READDIR,
+    CMD_STATUS,
+    CMD_VERSION,
+    SFTP_OP_UNSUPPORTED,
+    SFTPError,
+    _VERSION,
+)
+
+
+class SFTPClient(paramiko.SFTPClient):
+    """An SFTP client exposing server extensions and pipelined requests.
+
+    `paramiko.SFTPClient` only waits for one response at a time, and
+    discards the extensions advertised by the server during the version
+    negotiation. This subclass keeps the extensions in the `extensions`
+    attribute, and allows sending several requests with `SFTPClient.send`
+    before waiting for any of their responses with `SFTPClient.receive`.
+    """
+
+    def __init__(self, sock):  # noqa: D107
+        self.extensions = {}
+        self._responses = {}
+        self._receive_lock = threading.Lock()
+        super(SFTPClient, self).__init__(sock)
+
+    def _send_version(self):
+        # Same as `paramiko.sftp.BaseSFTP._send_version`, but parse the
+        # extension pairs following the version number
+        m = Message()
+        m.add_int(_VERSION)
+        self._send_packet(CMD_INIT, m)
+        t, data = self._read_packet()
+        if t != CMD_VERSION:
+            raise SFTPError("Incompatible sftp protocol")
+        version = struct.unpack(">I", data[:4])[0]
+        msg = Message(data[4:])
+        while msg.get_remainder():
+            name = msg.get_text()
+            self.extensions[name] = msg.get_binary()
+        return version
+
+    def _write_all(self, out):
+        # `paramiko.Channel.send` raises a plain `socket.error` once the
+        # channel is closed, which could not be told apart from an error
+        # reported by the server
+        if self.sock.closed:
+            raise paramiko.SSHException("SFTP session closed")
+        return super(SFTPClient, self)._write_all(out)
+
+    def _async_response(self, t, msg, num):
+        # called by `_read_response` with the responses to `send`
+        self._responses[num] = (t, msg)
+
+    def send(self, t, *args):
+        """Send a request without waiting for its response.
+
+        Returns:
+            int: the number of the request, to be passed to `receive`.
+        """
+        return self._async_request(self, t, *args)
+
+    def receive(self, num):
+        """Wait for the response to a request sent with `send`.
+
+        Several threads may wait for their own responses concurrently:
+        the one reading from the session stores the responses to the
+        requests of the others until they collect them.
+
+        Returns:
+            (int, paramiko.Message): the type and the content of the
+            response, positioned after the request number.
+
+        Raises:
+            IOError: when the server answered with an error status.
+                Unsupported operations raise an error with the
+                ``EOPNOTSUPP`` errno.
+            EOFError: when the server answered with an EOF status.
+        """
+        with self._receive_lock:
+            while num not in self._responses:
+                self._read_response()
+            t, msg = self._responses.pop(num)
+        return self.check_status(t, msg)
+
+    def check_status(self, t, msg):
+        """Check a response that was not obtained with `receive`.
+
+        The response is returned, or its error status raised, exactly as
+        with `SFTPClient.receive`.
+        """
+        if t == CMD_STATUS:
+            code = msg.get_int()
+            if code == SFTP_OP_UNSUPPORTED:
+                raise IOError(errno.EOPNOTSUPP, msg.get_text())
+            msg.rewind()
+            msg.get_int()
+            self._convert_status(msg)
+            msg.rewind()
+            msg.get_int()
+        return t, msg
+
+    def extended(self, name, *args):
+        """Send an extended request and wait for its response.
+
+        Raises:
+            IOError: when the server did not advertise the extension, or
+                answered with an error status.
+        """
+        if name not in self.extensions:
+            raise IOError(errno.EOPNOTSUPP, "{} not supported".format(name))
+        return self.receive(self.send(CMD_EXTENDED, name, *args))
+
+    def iterdir(self, path, read_ahead=4):
+        """Iterate over the entries of a directory as they are received.
+
+        Unlike `paramiko.SFTPClient.listdir_attr`, the directory is not read
+        entirely before returning, and unlike
+        `paramiko.SFTPClient.listdir_iter`, several directories can be
+        iterated over concurrently. At most ``read_ahead`` batches of
+        entries are requested in advance, so the memory used does not
+        depend on the size of the directory.
+
+        Yields:
+            paramiko.SFTPAttributes: the attributes of each entry, with
+            their ``filename`` attribute set.
+
+        """
+        t, msg = self.receive(self.send(CMD_OPENDIR, path))
+        if t != CMD_HANDLE:
+            raise SFTPError("Expected handle")
+        handle = msg.get_binary()
+        pending = collections.deque()
+        try:
+            while True:
+                while len(pending) < read_ahead:
+                    pending.append(self.send(CMD_READDIR, handle))
+                try:
+                    t, msg = self.receive(pending.popleft())
+                except EOFError:
+                    return
+                if t != CMD_NAME:
+                    raise SFTPError("Expected name response")
+                for _ in range(msg.get_int()):
+                    filename = msg.get_text()
+                    longname = msg.get_text()
+                    attr = paramiko.SFTPAttributes._from_msg(msg, filename, longname)
+                    if filename not in ('.', '..'):
+                        yield attr
+        finally:
+            while pending:
+                self._try_receive(pending.popleft())
+            self._try_receive(self.send(CMD_CLOSE, handle))
+
+    def pipeline(self, requests, window=64):
+        """Send several requests, keeping up to ``window`` of them in flight.
+
+        Arguments:
+            requests (iterable): The requests to send, as tuples of a
+                request type followed by its arguments.
+            window (int): The maximum number of requests sent without
+                their response having been received.
+
+        Yields:
+            (int, paramiko.Message) or Exception: the response to each
+            request, in order, or the error raised by `receive` when the
+            server answered with an error status.
+
+        """
+        pending = collections.deque()
+        try:
+            for request in requests:
+                pending.append(self.send(*request))
+                if len(pending) >= window:
+                    yield self._try_receive(pending.popleft())
+            while pending:
+                yield self._try_receive(pending.popleft())
+        finally:
+            # don't leave responses behind if the caller stopped early
+            while pending:
+                self._try_receive(pending.popleft())
+
+    def _try_receive(self, num):
+        try:
+            return self.receive(num)
+        except (IOError, EOFError) as err:
+            return err
@@ -4,29 +4,85 @@
 from __future__ import unicode_literals
 from __future__ import absolute_import
 
+import contextlib
+import errno
+import binascii
+import functools
+import hashlib
 import itertools
 import os
 import stat
 import socket
 import sys
+import tarfile
+import threading
+import time
 
 import six
 import paramiko
+from paramiko.sftp import CMD_EXTENDED, CMD_LSTAT, CMD_REMOVE, CMD_RMDIR, CMD_STAT, int64
+from six.moves import shlex_quote
 from property_cached import threaded_cached_property as cached_property
 
 from .. import errors
 from ..base import FS
+from ..copy import copy_dir
 from ..info import Info
 from ..enums import ResourceType
-from ..path import basename, dirname
+from ..path import basename, dirname, join, split
 from ..permissions import Permissions
 from ..osfs import OSFS
 from ..mode import Mode
 
+from .archive import read_tree, write_tree
+from .batch import SSHBatch
 from .file import SSHFile
+from .pool import SFTPPool
+from .registry import client_registry
+from .sftp import SFTPClient
+from .sync import sync_dir
+from .cache import StatCache
+from .walk import SSHWalker
+from .transfer import download_ranges, upload_ranges
 from .error_tools import convert_sshfs_errors
 
 
+_POSIX_PLATFORMS = ("linux", "darwin", "freebsd", "cygwin")
+
+# the file type (not following symlinks), size, modification and access
+# times, permissions, owner and group, and path of a file listed by `find`
+_FIND_FORMAT = r'%y %s %T@ %A@ %m %U %G %P\0'
+_FIND_NAMESPACES = ('basic', 'details', 'stat', 'access')
+_FIND_TYPES = {
+    b'f': stat.S_IFREG,
+    b'd': stat.S_IFDIR,
+    b'l': stat.S_IFLNK,
+    b'b': stat.S_IFBLK,
+    b'c': stat.S_IFCHR,
+    b'p': stat.S_IFIFO,
+    b's': stat.S_IFSOCK,
+}
+
+# the commands computing `hashlib` hashes on POSIX servers
+_HASH_COMMANDS = {
+    'md5': 'md5sum',
+    'sha1': 'sha1sum',
+    'sha224': 'sha224sum',
+    'sha256': 'sha256sum',
+    'sha384': 'sha384sum',
+    'sha512': 'sha512sum',
+    'blake2b': 'b2sum',
+}
+# the hashes that may be supported by the `check-file` SFTP extension
+_CHECK_FILE_HASHES = ('md5', 'sha1', 'sha224', 'sha256', 'sha384', 'sha512')
+# the hash of files given in the `hash` namespace
+_HASH_NAMESPACE = 'sha256'
+# the `tar` flags of the compressions supported by `tarfile`
+_TAR_COMPRESSIONS = {None: '', 'gz': 'z', 'bz2': 'j', 'xz': 'J'}
+# the line between the `passwd` and `group` entries listed by `getent`
+_NAMES_SEPARATOR = '%%'
+
+
 class SSHFS(FS):
     """A SSH filesystem using SFTP.
 
@@ -58,11 +114,49 @@ class SSHFS(FS):
         policy (paramiko.MissingHostKeyPolicy): The policy to use to resolve
             missing host keys. Defaults to ``None``, which will create a
             `paramiko.AutoAddPolicy` instance.
+        pool_size (int): The maximum number of idle SFTP sessions kept
+            around to be reused by new file handles (defaults to 4).
+        pool_idle_timeout (int): The number of seconds after which an idle
+            SFTP session is closed instead of being reused (defaults to 60,
+            set to 0 to never expire idle sessions).
+        pool_max_sessions (int): The maximum number of SFTP sessions the
+            pool opens at once, in addition to the main session, so as to
+            stay below the ``MaxSessions`` limit of the server (defaults to
+            8, set to 0 to disable the limit). When all of them are in use,
+            operations wait up to ``timeout`` seconds for one to be
+            released, and then raise `~fs.errors.OperationTimeout`.
+        names_ttl (int): The number of seconds the user and group names
+            listed from the server are cached for, when building the
+            ``access`` namespace (defaults to 60).
+        cache_ttl (int): The number of seconds the metadata of a resource
+            is cached for, in order to avoid repeated round trips when
+            checking the same path several times (defaults to 0, which
+            disables the cache). Changes made through this filesystem
+            invalidate the cache, but changes made on the server by
+            other clients may go unnoticed for up to ``cache_ttl`` seconds.
+        cache_size (int): The maximum number of resources whose metadata
+            is cached (defaults to 1024).
+        share_transport (bool): Set to ``True`` to reuse the SSH connection
+            of another filesystem of this process connected to the same
+            server with the same credentials, instead of connecting and
+            authenticating again (defaults to ``False``). The connection
+            is closed once all the filesystems using it are closed.
+        lazy (bool): Set to ``True`` to only connect to the server when
+            the filesystem is first used, instead of when it is created
+            (defaults to ``False``).
+        retries (int): The number of times an idempotent operation, such
+            as getting the info of a resource, listing a directory, or
+            opening a file for reading, is retried after reconnecting when
+            the connection to the server is lost (defaults to 3). Other
+            operations raise a `~fs.errors.RemoteConnectionError`.
+        retry_delay (float): The time, in seconds, to wait before the first
+            retry, doubled after every failed attempt (defaults to 1).
 
     Raises:
         fs.errors.CreateFailed: when the filesystem could not be created. The
             source exception is stored as the ``exc`` attribute of the
-            ``CreateFailed`` error.
+            ``CreateFailed`` error. With ``lazy=True``, this is raised by
+            the first operation instead.
     """
 
     _meta = {
@@ -76,6 +170,8 @@ class SSHFS(FS):
         'virtual': False,
     }
 
+    walker_class = SSHWalker
+
     @staticmethod
     def _get_ssh_config(config_path='~/.ssh/config'):
         """Extract the configuration located at ``config_path``.
@@ -104,6 +200,16 @@ class SSHFS(FS):
             config_path='~/.ssh/config',
             exec_timeout=None,
             policy=None,
+            pool_size=4,
+            pool_idle_timeout=60,
+            pool_max_sessions=8,
+            names_ttl=60,
+            cache_ttl=0,
+            cache_size=1024,
+            share_transport=False,
+            lazy=False,
+            retries=3,
+            retry_delay=1,
             **kwargs
     ):  # noqa: D102
         super(SSHFS, self).__init__()
@@ -118,13 +224,22 @@ class SSHFS(FS):
         self._user = user = user or config.get('user')
         self._host = host = config.get('hostname')
         self._port = port = int(config.get('port', port))
-        self._client = client = paramiko.SSHClient()
         self._timeout = timeout
         self._exec_timeout = timeout if exec_timeout is None else exec_timeout
+        self._names_ttl = names_ttl
+        self._names_lock = threading.Lock()
+        self._names_expiry = 0
+        self._names = {}
+        self._cache = StatCache(cache_ttl, cache_size)
+        self._sftp_lock = threading.Lock()
+        self._retries = retries
+        self._retry_delay = retry_delay
+        self._local = threading.local()
 
         _policy = paramiko.AutoAddPolicy() if policy is None else policy
 
-        try:
+        def connect():
+            client = paramiko.SSHClient()
             # TODO: add more options
             client.load_system_host_keys()
             client.set_missing_host_key_policy(_policy)
@@ -145,38 +260,292 @@ class SSHFS(FS):
 
             if keepalive > 0:
                 client.get_transport().set_keepalive(keepalive)
-            self._sftp = client.open_sftp()
+            return client
+
+        # only share a transport with filesystems using the same credentials
+        self._registry_key = None
+        if share_transport:
+            secret = passwd
+            if isinstance(secret, six.text_type):
+                secret = secret.encode('utf-8')
+            self._registry_key = (
+                user,
+                host,
+                port,
+                pkey.get_fingerprint() if pkey is not None else None,
+                tuple(keyfile) if isinstance(keyfile, list) else keyfile,
+                hashlib.sha256(secret).digest() if secret else None,
+            )
+
+        def open_connection():
+            try:
+                if self._registry_key is not None:
+                    client = client_registry.acquire(self._registry_key, connect)
+                else:
+                    client = connect()
+                sftp = SFTPClient.from_transport(client.get_transport())
+                pool = SFTPPool(
+                    client,
+                    pool_size,
+                    pool_idle_timeout,
+                    pool_max_sessions,
+                    timeout,
+                )
+                return client, sftp, pool
+
+            except (paramiko.ssh_exception.SSHException,            # protocol errors
+                    paramiko.ssh_exception.NoValidConnectionsError,  # connexion errors
+                    socket.gaierror, socket.timeout) as e:          # TCP errors
+
+                message = "Unable to create filesystem: {}".format(e)
+                raise errors.CreateFailed(message)
 
-        except (paramiko.ssh_exception.SSHException,            # protocol errors
-                paramiko.ssh_exception.NoValidConnectionsError,  # connexion errors
-                socket.gaierror, socket.timeout) as e:          # TCP errors
+        self._open_connection = open_connection
+        self._connection_lock = threading.Lock()
+        self._connection = None
+        self._connected = False
+        if not lazy:
+            self._connection = open_connection()
+            self._connected = True
 
-            message = "Unable to create filesystem: {}".format(e)
-            raise errors.CreateFailed(message)
+    @staticmethod
+    def _active(connection):
+        transport = connection[0].get_transport()
+        return transport is not None and transport.is_active()
+
+    def _connect(self):
+        """Get the connection to the server, opening it if needed.
+
+        A connection whose transport is not active anymore is replaced
+        by a new one, opened with the same parameters.
+
+        Returns:
+            tuple: the `paramiko.SSHClient`, the main `SFTPClient` and
+            the `SFTPPool` of the filesystem.
+
+        Raises:
+            fs.errors.CreateFailed: when the connection could not be
+                opened. Another attempt is made on the next operation.
+            fs.errors.RemoteConnectionError: when the connection was lost
+                and could not be opened again.
+
+        """
+        connection = self._connection
+        if connection is None or not self._active(connection):
+            with self._connection_lock:
+                connection = self._connection
+                if connection is None or not self._active(connection):
+                    self.check()
+                    connected, self._connection = self._connected, None
+                    if connection is not None:
+                        self._close_connection(connection)
+                    try:
+                        connection = self._open_connection()
+                    except errors.CreateFailed as err:
+                        if not connected:
+                            raise
+                        six.raise_from(errors.RemoteConnectionError(
+                            msg="unable to reconnect: {}".format(err)), err)
+                    self._connection = connection
+                    self._connected = True
+        return connection
+
+    def _retry(self, func, *args, **kwargs):
+        """Call ``func``, retrying it if the connection is lost meanwhile.
+
+        Only idempotent operations may be retried, since the server may
+        have processed the request before the connection was lost.
+        """
+        # operations calling other retried operations are only retried once
+        if getattr(self._local, 'retrying', False):
+            return func(*args, **kwargs)
+        self._local.retrying = True
+        try:
+            for attempt in itertools.count():
+                connection = self._connection
+                try:
+                    return func(*args, **kwargs)
+                except errors.RemoteConnectionError:
+                    # do not retry if the error was not caused by a lost
+                    # connection, e.g. if the server reported ENETDOWN
+                    alive = connection is not None \
+                        and connection is self._connection \
+                        and self._active(connection)
+                    if attempt >= self._retries or alive or self.isclosed():
+                        raise
+                time.sleep(self._retry_delay * 2 ** attempt)
+        finally:
+            self._local.retrying = False
+
+    @property
+    def _client(self):
+        return self._connect()[0]
+
+    @property
+    def _sftp(self):
+        return self._connect()[1]
+
+    @property
+    def _pool(self):
+        return self._connect()[2]
 
     if six.PY2:
 
         def close(self):  # noqa: D102
-            self._client.close()
+            self._close_client()
             super(SSHFS, self).close()
 
     else:
 
         def close(self): # noqa: D102
-            self._client.close()
+            self._close_client()
             super().close()
 
+    def _close_client(self):
+        """Close the connection to the server, if it was opened.
+        """
+        with self._connection_lock:
+            connection, self._connection = self._connection, None
+        if connection is not None:
+            self._close_connection(connection)
+
+    def _close_connection(self, connection):
+        """Close the SFTP sessions, and the client if it is not shared.
+        """
+        client, sftp, pool = connection
+        if self._registry_key is None:
+            client.close()
+            pool.close()
+        else:
+            # the transport may still be used by other filesystems
+            pool.close()
+            sftp.close()
+            client_registry.release(self._registry_key, client)
+
+    def copy(self, src_path, dst_path, overwrite=False, preserve_time=False):
+        """Copy file contents from ``src_path`` to ``dst_path``.
+
+        The copy is done on the server whenever possible: first with the
+        ``copy-data`` SFTP extension if the server advertises it, then with
+        a remote ``cp`` command on POSIX servers. The file contents are
+        only streamed through the client as a last resort.
+
+        Arguments:
+            src_path (str): Path of source file.
+            dst_path (str): Path to destination file.
+            overwrite (bool): If `True`, overwrite the destination file
+                if it exists (defaults to `False`).
+            preserve_time (bool): If `True`, try to preserve mtime of the
+                resource (defaults to `False`).
+
+        Raises:
+            fs.errors.DestinationExists: If ``dst_path`` exists,
+                and ``overwrite`` is `False`.
+            fs.errors.ResourceNotFound: If a parent directory of
+                ``dst_path`` does not exist.
+            fs.errors.FileExpected: If ``src_path`` is not a file.
+
+        """
+        self.check()
+        _src_path = self.validatepath(src_path)
+        _dst_path = self.validatepath(dst_path)
+
+        if not overwrite and self.exists(_dst_path):
+            raise errors.DestinationExists(dst_path)
+        src_info = self.getinfo(_src_path, namespaces=("details",))
+        if src_info.is_dir:
+            raise errors.FileExpected(src_path)
+        if not self.isdir(dirname(_dst_path)):
+            raise errors.ResourceNotFound(dst_path)
+        if self.isdir(_dst_path):
+            raise errors.FileExpected(dst_path)
+
+        try:
+            with convert_sshfs_errors('copy', dst_path):
+                copied = self._copy_data(_src_path, _dst_path)
+                if not copied:
+                    copied = self._copy_command(_src_path, _dst_path)
+        finally:
+            self._cache.invalidate(_dst_path)
+
+        if not copied:
+            super(SSHFS, self).copy(
+                _src_path, _dst_path, overwrite=True, preserve_time=False)
+        if preserve_time:
+            self.setinfo(_dst_path, {
+                "details": {
+                    "modified": src_info.raw["details"]["modified"],
+                    "accessed": src_info.raw["details"]["accessed"],
+                }
+            })
+
+    def copydir(self, src_path, dst_path, create=False, preserve_time=False):
+        """Copy the contents of ``src_path`` to ``dst_path``.
+
+        Files are copied on the server with the ``copy-data`` SFTP extension
+        if the server advertises it. Otherwise, the whole directory is
+        copied with a single remote ``cp`` command on POSIX servers, and
+        file contents are only streamed through the client as a last
+        resort.
+
+        Arguments:
+            src_path (str): Path of source directory.
+            dst_path (str): Path to destination directory.
+            create (bool): If `True`, then ``dst_path`` will be created
+                if it doesn't exist already (defaults to `False`).
+            preserve_time (bool): If `True`, try to preserve mtime of the
+                resource (defaults to `False`).
+
+        Raises:
+            fs.errors.ResourceNotFound: If the ``dst_path``
+                does not exist, and ``create`` is not `True`.
+            fs.errors.DirectoryExpected: If ``src_path`` is not a
+                directory.
+
+        """
+        self.check()
+        _src_path = self.validatepath(src_path)
+        _dst_path = self.validatepath(dst_path)
+
+        if not create and not self.exists(_dst_path):
+            raise errors.ResourceNotFound(dst_path)
+        if not self.getinfo(_src_path).is_dir:
+            raise errors.DirectoryExpected(src_path)
+
+        with self._session() as sftp:
+            copy_data = 'copy-data' in sftp.extensions
+        if not copy_data and self.platform in _POSIX_PLATFORMS:
+            self.makedirs(_dst_path, recreate=True)
+            try:
+                with convert_sshfs_errors('copydir', dst_path):
+                    copied = self._copy_command(
+                        join(_src_path, '.'),
+                        _dst_path,
+                        recursive=True,
+                        preserve_time=preserve_time,
+                    )
+            finally:
+                self._cache.invalidate(_dst_path, recursive=True)
+            if copied:
+                return
+        super(SSHFS, self).copydir(
+            _src_path, _dst_path, create=create, preserve_time=preserve_time)
+
     def getinfo(self, path, namespaces=None):  # noqa: D102
+        return self._retry(self._getinfo, path, namespaces)
+
+    def _getinfo(self, path, namespaces=None):
         self.check()
         namespaces = namespaces or ()
         _path = self.validatepath(path)
 
         with convert_sshfs_errors('getinfo', path):
-            _stat = self._sftp.stat(_path)
+            _stat = self._stat(_path)
             info = self._make_raw_info(basename(_path), _stat, namespaces)
 
             if "lstat" in namespaces or "link" in namespaces:
-                _lstat = self._sftp.lstat(_path)
+                with self._session() as sftp:
+                    _lstat = sftp.lstat(_path)
             if "lstat" in namespaces:
                 info["lstat"] = {
                     k: getattr(_lstat, k)
@@ -185,13 +554,137 @@ class SSHFS(FS):
                 }
             if "link" in namespaces:
                 if OSFS._get_type_from_stat(_lstat) == ResourceType.symlink:
-                    target = self._sftp.readlink(_path)
+                    with self._session() as sftp:
+                        target = sftp.readlink(_path)
                     info["link"] = {"target": target}
                 else:
                     info["link"] = {"target": None}
+            if "hash" in namespaces:
+                digest = None
+                if stat.S_ISREG(_stat.st_mode):
+                    digest = self.hash(_path, _HASH_NAMESPACE)
+                info["hash"] = {_HASH_NAMESPACE: digest}
 
             return Info(info)
 
+    def getinfo_many(self, paths, namespaces=None, window=64):
+        """Get info regarding several resources on the filesystem.
+
+        Unlike calling `~SSHFS.getinfo` for each path, this sends up to
+        ``window`` stat requests before waiting for any response, so that
+        the latency of the connection is only paid once per batch.
+
+        Arguments:
+            paths (iterable): The paths to the resources.
+            namespaces (list, optional): Info namespaces to query, as in
+                `~SSHFS.getinfo`.
+            window (int): The maximum number of requests in flight.
+
+        Yields:
+            fs.info.Info or Exception: the info of each resource,
+            in the same order as ``paths``, or the error that
+            `~SSHFS.getinfo` would have raised for that path.
+
+        """
+        self.check()
+        namespaces = namespaces or ()
+        lstat = "lstat" in namespaces or "link" in namespaces
+        paths = iter(paths)
+        while True:
+            batch = list(itertools.islice(paths, 1024))
+            if not batch:
+                return
+            # stating paths is idempotent, so the batch can be retried
+            results = self._retry(
+                lambda: list(self._getinfo_batch(batch, namespaces, lstat, window)))
+            if "hash" in namespaces:
+                results = self._add_hashes(results, batch)
+            for result in results:
+                yield result
+
+    def exists_many(self, paths, window=64):
+        """Check if several paths map to existing resources.
+
+        Arguments:
+            paths (iterable): The paths to check.
+            window (int): The maximum number of requests in flight.
+
+        Yields:
+            bool: whether each path exists, in the same order as ``paths``.
+
+        Raises:
+            fs.errors.FSError: when checking a path fails for another reason
+                than the resource not existing, as in `~SSHFS.exists`.
+
+        """
+        for result in self.getinfo_many(paths, window=window):
+            if isinstance(result, errors.ResourceNotFound):
+                yield False
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                yield True
+
+    def hash(self, path, name):
+        """Get the hash of a file's contents, computed on the server.
+
+        On POSIX servers, the hash is computed with the matching
+        ``*sum`` command (e.g. ``sha256sum``), otherwise with the
+        ``check-file`` SFTP extension if the server advertises it. The
+        file is downloaded and hashed locally when neither is available.
+
+        Arguments:
+            path (str): A path on the filesystem.
+            name (str): One of the algorithms supported by the `hashlib`
+                module, e.g. ``"md5"`` or ``"sha256"``.
+
+        Returns:
+            str: The hex digest of the hash.
+
+        Raises:
+            fs.errors.UnsupportedHash: If the requested hash is not supported.
+            fs.errors.ResourceNotFound: If ``path`` does not exist.
+            fs.errors.FileExpected: If ``path`` exists but is not a file.
+
+        """
+        result = next(self.hash_many([path], name))
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def hash_many(self, paths, name):
+        """Get the hashes of several files, computed on the server.
+
+        Unlike calling `~SSHFS.hash` for each path, this hashes up to 256
+        files with a single remote command on POSIX servers.
+
+        Arguments:
+            paths (iterable): The paths to the files.
+            name (str): One of the algorithms supported by the `hashlib`
+                module, e.g. ``"md5"`` or ``"sha256"``.
+
+        Yields:
+            str or Exception: the hex digest of each file, in the same
+            order as ``paths``, or the error that `~SSHFS.hash` would
+            have raised for that path.
+
+        Raises:
+            fs.errors.UnsupportedHash: If the requested hash is not supported.
+
+        """
+        self.check()
+        try:
+            hashlib.new(name)
+        except ValueError:
+            raise errors.UnsupportedHash("hash '{}' is not supported".format(name))
+        paths = iter(paths)
+        while True:
+            batch = list(itertools.islice(paths, 256))
+            if not batch:
+                return
+            for result in self._hash_batch(batch, name):
+                yield result
+
     def geturl(self, path, purpose='download'):  # noqa: D102
         _path = self.validatepath(path)
         if purpose != 'download':
@@ -203,6 +696,9 @@ class SSHFS(FS):
         return self.getinfo(path, namespaces=["link"]).is_link
 
     def listdir(self, path):  # noqa: D102
+        return self._retry(self._listdir, path)
+
+    def _listdir(self, path):
         self.check()
         _path = self.validatepath(path)
 
@@ -210,22 +706,38 @@ class SSHFS(FS):
         if _type is not ResourceType.directory:
             raise errors.DirectoryExpected(path)
 
-        with convert_sshfs_errors('listdir', path):
-            return self._sftp.listdir(_path)
+        with convert_sshfs_errors('listdir', path), self._session() as sftp:
+            return sftp.listdir(_path)
 
     def scandir(self, path, namespaces=None, page=None):  # noqa: D102
+        infos = self._scandir(path, namespaces, page)
+        if namespaces and "hash" in namespaces:
+            # hash all the files of the page at once
+            infos = list(infos)
+            paths = [join(path, info.name) for info in infos]
+            return iter(self._add_hashes(infos, paths))
+        return infos
+
+    def _scandir(self, path, namespaces=None, page=None):
         self.check()
         _path = self.validatepath(path)
         _namespaces = namespaces or ()
         start, stop = page or (None, None)
         try:
             with convert_sshfs_errors('scandir', path, directory=True):
-                # We can't use listdir_iter here because it doesn't support
-                # concurrent iteration over multiple directories, which can
-                # happen during a search="depth" walk.
-                listing = self._sftp.listdir_attr(_path)
-                for _stat in itertools.islice(listing, start, stop):
-                    yield Info(self._make_raw_info(_stat.filename, _stat, _namespaces))
+                # Entries are read in batches on a handle of our own, over
+                # the session shared by all listings: a search="depth" walk
+                # keeps one listing open per level, which must not hold a
+                # session each while yielding.
+                listing = self._pool.shared().iterdir(_path)
+                try:
+                    for _stat in itertools.islice(listing, start, stop):
+                        # directory listings do not follow symlinks
+                        if not stat.S_ISLNK(_stat.st_mode):
+                            self._cache.put(join(_path, _stat.filename), _stat)
+                        yield Info(self._make_raw_info(_stat.filename, _stat, _namespaces))
+                finally:
+                    listing.close()
         except errors.ResourceNotFound:
             # When given a bad path to listdir, the sftp client raises IOError
             # with an errno of ENOENT no matter if the path was missing or was
@@ -243,9 +755,9 @@ class SSHFS(FS):
         try:
             info = self.getinfo(_path)
         except errors.ResourceNotFound:
-            with self._lock:
-                with convert_sshfs_errors('makedir', path):
-                    self._sftp.mkdir(_path, _permissions.mode)
+            with convert_sshfs_errors('makedir', path), self._session() as sftp:
+                sftp.mkdir(_path, _permissions.mode)
+            self._cache.invalidate(_path)
         else:
             if (info.is_dir and not recreate) or info.is_file:
                 six.raise_from(errors.DirectoryExists(path), None)
@@ -259,31 +771,35 @@ class SSHFS(FS):
         _src_path = self.validatepath(src_path)
         _dst_path = self.validatepath(dst_path)
 
-        with self._lock:
-            # check src exists and is a file
-            src_info = self.getinfo(_src_path, namespaces=info_ns)
-            if src_info.is_dir:
-                raise errors.FileExpected(src_path)
-            # check dst is not a dir and can be created
-            if self.isdir(_dst_path):
-                raise errors.FileExpected(dst_path)
-            if not self.isdir(dirname(_dst_path)):
-                raise errors.ResourceNotFound(dirname(dst_path))
-            # check dst does not exist or remove it
-            if self.isfile(_dst_path):
-                if not overwrite:
-                    raise errors.DestinationExists(dst_path)
-                with convert_sshfs_errors('move', dst_path):
-                    self._sftp.remove(_dst_path)
-            # rename the file through SFTP's 'RENAME'
-            self._sftp.rename(_src_path, _dst_path)
-            # preserve times if required
-            if preserve_time:
-                self._utime(
-                    _path,
-                    src_info.raw["details"]["modified"],
-                    src_info.raw["details"]["accessed"],
-                )
+        # check src exists and is a file
+        src_info = self.getinfo(_src_path, namespaces=info_ns)
+        if src_info.is_dir:
+            raise errors.FileExpected(src_path)
+        # check dst is not a dir and can be created
+        if self.isdir(_dst_path):
+            raise errors.FileExpected(dst_path)
+        if not self.isdir(dirname(_dst_path)):
+            raise errors.ResourceNotFound(dirname(dst_path))
+        # check dst does not exist or remove it
+        if self.isfile(_dst_path):
+            if not overwrite:
+                raise errors.DestinationExists(dst_path)
+            with convert_sshfs_errors('move', dst_path), self._session() as sftp:
+                sftp.remove(_dst_path)
+        # rename the file through SFTP's 'RENAME'
+        try:
+            with self._session() as sftp:
+                sftp.rename(_src_path, _dst_path)
+        finally:
+            self._cache.invalidate(_src_path)
+            self._cache.invalidate(_dst_path)
+        # preserve times if required
+        if preserve_time:
+            self._utime(
+                _dst_path,
+                src_info.raw["details"]["modified"],
+                src_info.raw["details"]["accessed"],
+            )
 
     def openbin(self, path, mode='r', buffering=-1, **options):  # noqa: D102
         """Open a binary file-like object.
@@ -303,6 +819,25 @@ class SSHFS(FS):
             prefetch (bool): Use background threading to prefetch the file
                 content when opened in reading mode. Disable in case of
                 threading issues. Defaults to ``True``.
+            prefetch_window (int): Prefetch the file by keeping at most this
+                number of bytes requested ahead of the reader, refilled as
+                the data is consumed, instead of requesting the whole file
+                at once. Defaults to ``None``.
+            prefetch_range (tuple): Only prefetch the ``(start, stop)`` byte
+                range of the file, ``stop`` being `None` to prefetch until
+                the end of the file. Defaults to ``None``.
+            block_cache (int): The number of bytes of the file to cache in
+                memory when opened in read-only mode, to serve random access
+                reads without round trips to the server. Blocks are read
+                ahead on sequential access. Replaces prefetching when
+                enabled. Defaults to ``0`` (disabled).
+            block_size (int): The size of the aligned blocks fetched when
+                the block cache is enabled. Defaults to ``32768``.
+            write_behind (int): The number of bytes that may be written to
+                the server without being acknowledged yet, when opened in
+                writing mode. Small writes are then coalesced into full
+                SFTP packets, and `~io.IOBase.flush` waits for all writes
+                to be acknowledged. Defaults to ``0`` (disabled).
 
         Raises:
             fs.errors.FileExpected: if the path if not a file.
@@ -313,33 +848,70 @@ class SSHFS(FS):
         Returns:
             io.IOBase: a file handle.
         """
+        if Mode(mode).writing:
+            return self._openbin(path, mode, buffering, **options)
+        # opening a file for reading has no side effect
+        return self._retry(self._openbin, path, mode, buffering, **options)
+
+    def _openbin(self, path, mode='r', buffering=-1, **options):
         self.check()
         _path = self.validatepath(path)
         _mode = Mode(mode)
         _mode.validate_bin()
 
-        with self._lock:
-            if _mode.exclusive:
-                if self.exists(_path):
-                    raise errors.FileExists(path)
-                else:
-                    _mode = Mode(''.join(set(mode.replace('x', 'w'))))
-            elif not _mode.create and not self.exists(_path):
-                raise errors.ResourceNotFound(path)
-            elif self.isdir(_path):
-                raise errors.FileExpected(path)
+        if _mode.exclusive:
+            if self.exists(_path):
+                raise errors.FileExists(path)
+            else:
+                _mode = Mode(''.join(set(mode.replace('x', 'w'))))
+        elif not _mode.create and not self.exists(_path):
+            raise errors.ResourceNotFound(path)
+        elif self.isdir(_path):
+            raise errors.FileExpected(path)
+        on_close = None
+        if _mode.writing:
+            self._cache.invalidate(_path)
+            on_close = functools.partial(self._cache.invalidate, _path)
+        block_cache = options.get("block_cache", 0)
+        if not _mode.reading or _mode.writing:
+            block_cache = 0
+        _sftp = self._pool.acquire()
+        try:
             with convert_sshfs_errors('openbin', path):
-                _sftp = self._client.open_sftp()
                 handle = _sftp.open(
                     _path,
                     mode=_mode.to_platform_bin(),
                     bufsize=buffering
                 )
                 handle.set_pipelined(options.get("pipelined", True))
-                if options.get("prefetch", True):
+                size = prefetch_window = prefetch_range = None
+                if block_cache > 0:
+                    # the size is taken from the open handle if not cached
+                    _stat = self._cache.get(_path) or handle.stat()
+                    size = _stat.st_size
+                elif options.get("prefetch", True):
                     if _mode.reading and not _mode.writing:
-                        handle.prefetch(self.getsize(_path))
-                return SSHFile(handle, _mode.to_platform_bin())
+                        prefetch_window = options.get("prefetch_window")
+                        prefetch_range = options.get("prefetch_range")
+                        if prefetch_window is None and prefetch_range is None:
+                            # prefetch falls back to fstat if the size is unknown
+                            _stat = self._cache.get(_path)
+                            handle.prefetch(_stat.st_size if _stat else None)
+        except Exception:
+            self._pool.release(_sftp)
+            raise
+        return SSHFile(
+            handle,
+            _mode.to_platform_bin(),
+            pool=self._pool,
+            on_close=on_close,
+            block_cache=block_cache,
+            block_size=options.get("block_size", 32768),
+            size=size,
+            prefetch_window=prefetch_window,
+            prefetch_range=prefetch_range,
+            write_behind=options.get("write_behind", 0) if _mode.writing else 0,
+        )
 
     def remove(self, path):  # noqa: D102
         self.check()
@@ -350,9 +922,9 @@ class SSHFS(FS):
         if self.getinfo(_path).is_dir:
             raise errors.FileExpected(path)
 
-        with convert_sshfs_errors('remove', path):
-            with self._lock:
-                self._sftp.remove(_path)
+        with convert_sshfs_errors('remove', path), self._session() as sftp:
+            sftp.remove(_path)
+        self._cache.invalidate(_path)
 
     def removedir(self, path):  # noqa: D102
         self.check()
@@ -364,80 +936,294 @@ class SSHFS(FS):
         if not self.isempty(_path):
             raise errors.DirectoryNotEmpty(path)
 
-        with convert_sshfs_errors('removedir', path):
-            with self._lock:
-                self._sftp.rmdir(_path)
+        with convert_sshfs_errors('removedir', path), self._session() as sftp:
+            sftp.rmdir(_path)
+        self._cache.invalidate(_path, recursive=True)
 
-    def setinfo(self, path, info):  # noqa: D102
+    def removetree(self, dir_path):  # noqa: D102
         self.check()
-        _path = self.validatepath(path)
+        _path = self.validatepath(dir_path)
 
+        # NB: this will raise ResourceNotFound
+        if not self.getinfo(_path).is_dir:
+            raise errors.DirectoryExpected(dir_path)
+
+        try:
+            with convert_sshfs_errors('removetree', dir_path, directory=True):
+                if not self._remove_command(_path):
+                    self._remove_pipelined(_path)
+        finally:
+            self._cache.invalidate(_path, recursive=True)
+
+    def setinfo(self, path, info):  # noqa: D102
+        self.check()
         if not self.exists(path):
             raise errors.ResourceNotFound(path)
+        self._setinfo(path, info)
+
+    def _setinfo(self, path, info):
+        """Set the info of a resource, without checking it exists first.
+
+        Returns:
+            bool: `True` if some info was set, `False` if ``info`` did not
+            contain any info that can be set.
+        """
+        self.check()
+        _path = self.validatepath(path)
 
         access = info.get('access', {})
         details = info.get('details', {})
+        changed = False
 
-        with convert_sshfs_errors('setinfo', path):
-            if 'accessed' in details or 'modified' in details:
-                self._utime(_path,
-                            details.get("modified"),
-                            details.get("accessed"))
-            if 'uid' in access or 'gid' in access:
-                self._chown(_path,
-                            access.get('uid'),
-                            access.get('gid'))
-            if 'permissions' in access:
-                self._chmod(_path, access['permissions'].mode)
-
-    def download(self, path, file, chunk_size=None, callback=None, **options):
+        try:
+            with convert_sshfs_errors('setinfo', path):
+                if 'accessed' in details or 'modified' in details:
+                    self._utime(_path,
+                                details.get("modified"),
+                                details.get("accessed"))
+                    changed = True
+                if 'uid' in access or 'gid' in access:
+                    self._chown(_path,
+                                access.get('uid'),
+                                access.get('gid'))
+                    changed = True
+                if 'permissions' in access:
+                    self._chmod(_path, access['permissions'].mode)
+                    changed = True
+        finally:
+            self._cache.invalidate(_path)
+        return changed
+
+    def download(
+            self,
+            path,
+            file,
+            chunk_size=None,
+            callback=None,
+            workers=1,
+            resume=False,
+            resume_check=0,
+            delta=False,
+            delta_block_size=1048576,
+            **options
+    ):
         """Copy a file from the filesystem to a file-like object.
 
         This method uses the underlying `paramiko.SFTP.getfo` method, which
         should be more efficient than manually opening and reading from a
-        file.
+        file. With more than one worker, byte ranges of the file are instead
+        fetched concurrently over several SFTP sessions, which can make
+        better use of high-latency, high-bandwidth links.
 
         Arguments:
             path (str): Path to a resource.
             file (file-like): A file-like object open for writing in
                 binary mode.
-            chunk_size (int, optional): Ignored, kept for compatibility
-                with the `fs.base.FS.download` signature.
+            chunk_size (int, optional): The size of the byte ranges fetched
+                by each worker. Ignored when using a single worker.
             callback (callable, optional): An optional callback function
                 (form: ``func(int, int)``) that accepts the bytes transferred
                 so far and the total bytes to be transferred. Passed
                 transparently to `~paramiko.SFTP.getfo`.
+            workers (int): The number of concurrent workers to use. Ranges
+                are written at their offset in ``file``, so it must be
+                seekable, otherwise a single worker is used. Defaults to
+                ``1``.
+            resume (bool): Set to `True` to resume a previous download
+                into ``file``: the bytes between its current position and
+                its end are kept if the remote file is at least as large,
+                and only the remaining bytes are downloaded. ``file`` must
+                be seekable (e.g. opened in ``r+b`` mode). The skipped
+                bytes are reported in the first call to ``callback``.
+            resume_check (int): The number of bytes before the resume
+                offset to compare with the remote file before resuming,
+                in which case ``file`` must also be readable. The whole
+                file is downloaded again if they differ. Defaults to ``0``.
+            delta (bool): Set to `True` to only download the blocks of the
+                file that differ from the content of ``file``, which must
+                be seekable and readable (e.g. opened in ``r+b`` mode).
+                The blocks are compared with their MD5, computed on the
+                server with the ``check-file`` SFTP extension or with the
+                GNU ``split`` command. The whole file is downloaded if
+                neither is available.
+            delta_block_size (int): The size of the blocks compared in
+                delta mode. Defaults to 1 MiB.
+
+        Keyword Arguments:
+            options: Ignored, accepted for compatibility with
+                `~fs.base.FS.download`.
+
+        Raises:
+            fs.errors.ResourceNotFound: If ``path`` does not exist.
+            fs.errors.FileExpected: If ``path`` is not a file.
+            ValueError: If ``resume`` or ``delta`` is `True` but ``file``
+                is not seekable.
 
         Note that the file object ``file`` will *not* be closed by this
         method. Take care to close it after this method completes
-        (ideally with a context manager).
+        (ideally with a context manager). When ``file`` is seekable, the
+        download is retried from its initial position if the connection
+        to the server is lost, or resumed with ``resume=True``.
 
         Example:
             >>> with open('starwars.mov', 'wb') as write_file:
             ...     my_fs.download('/movies/starwars.mov', write_file)
 
         """
+        if not getattr(file, 'seekable', lambda: False)():
+            if resume or delta:
+                raise ValueError("resumed and delta downloads need a seekable file")
+            return self._download(path, file, chunk_size, callback, workers)
+        # the download can be retried by writing the file again
+        start = file.tell()
+
+        def download():
+            file.seek(start)
+            if delta and self._download_delta(path, file, callback, delta_block_size):
+                return
+            file.seek(start)
+            if resume:
+                self._download_resume(path, file, chunk_size, callback, workers, resume_check)
+            else:
+                self._download(path, file, chunk_size, callback, workers)
+
+        self._retry(download)
+
+    def _download_resume(self, path, file, chunk_size=None, callback=None, workers=1, check=0):
+        _path = self.validatepath(path)
+        self._cache.invalidate(_path)
+        info = self.getinfo(_path, namespaces=('details',))
+        if info.is_dir:
+            raise errors.FileExpected(path)
+        base = file.tell()
+        file.seek(0, 2)
+        local_size = file.tell() - base
+        offset = local_size if local_size <= info.size else 0
+        with convert_sshfs_errors('download', path):
+            if offset and check:
+                offset = self._resume_offset(_path, file, base, offset, check)
+            if offset < local_size:
+                file.seek(base + offset)
+                file.truncate()
+            file.seek(base)
+            download_ranges(
+                self._pool,
+                _path,
+                file,
+                info.size,
+                chunk_size=chunk_size,
+                callback=callback,
+                workers=workers,
+                offset=offset,
+            )
+
+    def _download_delta(self, path, file, callback=None, block_size=1048576):
+        """Download the blocks of a file that differ from ``file``.
+
+        Returns:
+            bool: `False` if the blocks of the remote file could not be
+            compared with ``file``, in which case nothing was downloaded.
+        """
+        if not getattr(file, 'readable', lambda: False)():
+            return False
+        _path = self.validatepath(path)
+        self._cache.invalidate(_path)
+        info = self.getinfo(_path, namespaces=('details',))
+        if info.is_dir:
+            raise errors.FileExpected(path)
+        size = info.size
+        base = file.tell()
+        file.seek(0, 2)
+        local_size = file.tell() - base
+        if not local_size:
+            return False
+        with convert_sshfs_errors('download', path):
+            hashes = self._block_hashes(_path, block_size)
+            if hashes is None or len(hashes) != -(-size // block_size):
+                return False
+            with self.openbin(_path, 'rb', prefetch=False) as remote:
+                for index, digest in enumerate(hashes):
+                    offset = index * block_size
+                    file.seek(base + offset)
+                    if hashlib.md5(file.read(block_size)).digest() != digest:
+                        remote.seek(offset)
+                        file.seek(base + offset)
+                        file.write(remote.read(block_size))
+                    if callback is not None:
+                        callback(min(offset + block_size, size), size)
+        if local_size > size:
+            file.seek(base + size)
+            file.truncate()
+        file.seek(base + size)
+        return True
+
+    def _resume_offset(self, path, file, base, offset, check):
+        """Check a transfer can be resumed from ``offset``.
+
+        Returns:
+            int: ``offset`` if the last ``check`` bytes before it are the
+            same in ``file`` (starting at ``base``) and in the remote file
+            at ``path``, or ``0`` if the transfer must be started over.
+        """
+        size = min(check, offset)
+        file.seek(base + offset - size)
+        local = file.read(size)
+        with self._pool.session() as sftp, sftp.open(path, 'rb') as handle:
+            remote = b''.join(handle.readv([(offset - size, size)]))
+        return offset if local == remote else 0
+
+    def _download(self, path, file, chunk_size=None, callback=None, workers=1):
         _path = self.validatepath(path)
-        with self._lock:
-            if not self.exists(_path):
-                raise errors.ResourceNotFound(path)
-            elif self.isdir(_path):
+        if workers > 1 and getattr(file, 'seekable', lambda: False)():
+            info = self.getinfo(_path, namespaces=('details',))
+            if info.is_dir:
                 raise errors.FileExpected(path)
             with convert_sshfs_errors('download', path):
-                self._sftp.getfo(_path, file, callback=callback)
+                download_ranges(
+                    self._pool,
+                    _path,
+                    file,
+                    info.size,
+                    chunk_size=chunk_size,
+                    callback=callback,
+                    workers=workers,
+                )
+            return
+        if not self.exists(_path):
+            raise errors.ResourceNotFound(path)
+        elif self.isdir(_path):
+            raise errors.FileExpected(path)
+        with convert_sshfs_errors('download', path), self._pool.session() as sftp:
+            sftp.getfo(_path, file, callback=callback)
 
-    def upload(self, path, file, chunk_size=None, callback=None, file_size=None, confirm=True, **options):
+    def upload(
+            self,
+            path,
+            file,
+            chunk_size=None,
+            callback=None,
+            file_size=None,
+            confirm=True,
+            workers=1,
+            resume=False,
+            resume_check=0,
+            delta=False,
+            delta_block_size=1048576,
+            **options
+    ):
         """Set a file to the contents of a binary file object.
 
         This method uses the underlying `paramiko.SFTP.putfo` method, which
         should be more efficient than manually opening and writing to a file.
+        With more than one worker, byte ranges read from ``file`` are
+        instead written concurrently over several SFTP sessions.
 
         Arguments:
             path (str): A path on the filesystem.
             file (io.IOBase): A file object open for reading in
                 binary mode.
-            chunk_size (int, optional): Ignored, kept for compatibility
-                with the `fs.base.FS.download` signature.
+            chunk_size (int, optional): The size of the byte ranges written
+                by each worker. Ignored when using a single worker.
             callback (callable, optional): An optional callback function
                 (form: ``func(int, int)``) that accepts the bytes transferred
                 so far and the total bytes to be transferred. Passed
@@ -446,10 +1232,38 @@ class SSHFS(FS):
                 to ``callback``. If `None` is given, uses ``0``.
             confirm (bool): If `True` (the default), do a ``stat()`` call
                 once finished to confirm the size of the uploaded file.
+            workers (int): The number of concurrent workers to use.
+                Defaults to ``1``.
+            resume (bool): Set to `True` to resume a previous upload of
+                ``file``: if the remote file is not larger than the data
+                between the current position of ``file`` and its end, only
+                the bytes after its size are uploaded. ``file`` must be
+                seekable. The skipped bytes are reported in the first call
+                to ``callback``, and the upload is done by a single worker,
+                so that an interrupted upload can be resumed as well.
+            resume_check (int): The number of bytes before the resume
+                offset to compare with the remote file before resuming.
+                The whole file is uploaded again if they differ. Defaults
+                to ``0``.
+            delta (bool): Set to `True` to only upload the blocks of
+                ``file`` that differ from the remote file, written in place.
+                ``file`` must be seekable. The blocks are compared with
+                their MD5, computed on the server with the ``check-file``
+                SFTP extension or with the GNU ``split`` command. The whole
+                file is uploaded if neither is available.
+            delta_block_size (int): The size of the blocks compared in
+                delta mode. Defaults to 1 MiB.
+
+        Keyword Arguments:
+            options: Ignored, accepted for compatibility with
+                `~fs.base.FS.upload`.
 
         Raises:
             fs.errors.ResourceNotFound: If a parent directory of
                 ``path`` does not exist.
+            fs.errors.FileExpected: If ``path`` is a directory.
+            ValueError: If ``resume`` or ``delta`` is `True` but ``file``
+                is not seekable.
 
         Note that the file object ``file`` will *not* be closed by this
         method. Take care to close it after this method completes
@@ -460,20 +1274,384 @@ class SSHFS(FS):
             ...     my_fs.upload('starwars.mov', read_file)
 
         """
+        if resume or delta:
+            if not getattr(file, 'seekable', lambda: False)():
+                raise ValueError("resumed and delta uploads need a seekable file")
+            # the upload can be retried by resuming or comparing it again
+            start = file.tell()
+
+            def upload():
+                file.seek(start)
+                if delta and self._upload_delta(path, file, callback, delta_block_size):
+                    return
+                file.seek(start)
+                if resume:
+                    self._upload_resume(path, file, chunk_size, callback, confirm, resume_check)
+                else:
+                    self._upload(path, file, chunk_size, callback, file_size, confirm, workers)
+
+            return self._retry(upload)
+        return self._upload(path, file, chunk_size, callback, file_size, confirm, workers)
+
+    def _upload(
+            self,
+            path,
+            file,
+            chunk_size=None,
+            callback=None,
+            file_size=None,
+            confirm=True,
+            workers=1,
+    ):
+        _path = self.validatepath(path)
+        if not self.exists(dirname(_path)):
+            raise errors.ResourceNotFound(path)
+        elif self.isdir(_path):
+            raise errors.FileExpected(path)
+        try:
+            with convert_sshfs_errors('upload', path):
+                if workers > 1:
+                    size = upload_ranges(
+                        self._pool,
+                        _path,
+                        file,
+                        chunk_size=chunk_size,
+                        callback=callback,
+                        file_size=file_size,
+                        workers=workers,
+                    )
+                    if confirm:
+                        with self._session() as sftp:
+                            _stat = sftp.stat(_path)
+                        if _stat.st_size != size:
+                            raise IOError("size mismatch in put!  {} != {}".format(
+                                _stat.st_size, size))
+                else:
+                    with self._pool.session() as sftp:
+                        sftp.putfo(
+                            file,
+                            _path,
+                            file_size=file_size,
+                            callback=callback,
+                            confirm=confirm
+                        )
+        finally:
+            self._cache.invalidate(_path)
+
+    def _upload_delta(self, path, file, callback=None, block_size=1048576):
+        """Upload the blocks of ``file`` that differ from a remote file.
+
+        Returns:
+            bool: `False` if the blocks of the remote file could not be
+            compared with ``file``, in which case nothing was uploaded.
+        """
+        _path = self.validatepath(path)
+        self._cache.invalidate(_path)
+        try:
+            info = self.getinfo(_path, namespaces=('details',))
+        except errors.ResourceNotFound:
+            return False
+        if info.is_dir:
+            raise errors.FileExpected(path)
+        base = file.tell()
+        file.seek(0, 2)
+        size = file.tell() - base
+        file.seek(base)
+        try:
+            with convert_sshfs_errors('upload', path):
+                hashes = self._block_hashes(_path, block_size)
+                if hashes is None or len(hashes) != -(-info.size // block_size):
+                    return False
+                # changed blocks are written in place without waiting for
+                # each write to be acknowledged
+                with self.openbin(_path, 'r+b', write_behind=4 * block_size) as remote:
+                    offset = 0
+                    for digest in itertools.chain(hashes, itertools.repeat(None)):
+                        block = file.read(block_size)
+                        if not block:
+                            break
+                        if digest is None or hashlib.md5(block).digest() != digest:
+                            remote.seek(offset)
+                            remote.write(block)
+                        offset += len(block)
+                        if callback is not None:
+                            callback(offset, size)
+                    if info.size > size:
+                        remote.truncate(size)
+        finally:
+            self._cache.invalidate(_path)
+        return True
+
+    def _upload_resume(self, path, file, chunk_size=None, callback=None, confirm=True, check=0):
         _path = self.validatepath(path)
-        with self._lock:
-            if not self.exists(dirname(_path)):
-                raise errors.ResourceNotFound(path)
-            elif self.isdir(_path):
+        if not self.exists(dirname(_path)):
+            raise errors.ResourceNotFound(path)
+        # the size of a partially uploaded file must be up-to-date
+        self._cache.invalidate(_path)
+        try:
+            remote_size = self.getsize(_path)
+        except errors.ResourceNotFound:
+            remote_size = 0
+        else:
+            if self.isdir(_path):
                 raise errors.FileExpected(path)
+        base = file.tell()
+        file.seek(0, 2)
+        local_size = file.tell() - base
+        offset = remote_size if remote_size <= local_size else 0
+        try:
             with convert_sshfs_errors('upload', path):
-                self._sftp.putfo(
-                    file,
+                if offset and check:
+                    offset = self._resume_offset(_path, file, base, offset, check)
+                file.seek(base + offset)
+                size = upload_ranges(
+                    self._pool,
                     _path,
-                    file_size=file_size,
+                    file,
+                    chunk_size=chunk_size,
                     callback=callback,
-                    confirm=confirm
+                    file_size=local_size,
+                    workers=1,
+                    offset=offset,
                 )
+                if confirm:
+                    with self._session() as sftp:
+                        _stat = sftp.stat(_path)
+                    if _stat.st_size != size:
+                        raise IOError("size mismatch in put!  {} != {}".format(
+                            _stat.st_size, size))
+        finally:
+            self._cache.invalidate(_path)
+
+    def sync_from(
+            self,
+            src_fs,
+            src_path='/',
+            dst_path='/',
+            delete=False,
+            checksum=False,
+            workers=4,
+            dry_run=False,
+    ):
+        """Synchronize a directory of this filesystem from another filesystem.
+
+        Both trees are listed once, the remote one with a single command
+        when possible, and compared to only copy the files that are missing
+        or whose size or modification time differ. Files are uploaded
+        concurrently over several SFTP sessions.
+
+        Arguments:
+            src_fs (fs.base.FS): The filesystem to copy files from.
+            src_path (str): The path to the source directory in ``src_fs``.
+            dst_path (str): The path to the directory of this filesystem to
+                synchronize, created if it does not exist.
+            delete (bool): Set to `True` to remove the resources below
+                ``dst_path`` that are not in the source directory.
+            checksum (bool): Set to `True` to compare the SHA-256 of files
+                of the same size, computed on the server, instead of their
+                modification times.
+            workers (int): The number of files copied concurrently.
+            dry_run (bool): Set to `True` to only plan the operations,
+                without changing anything.
+
+        Returns:
+            fs.sshfs.sync.SyncStats: the operations and statistics of the
+            synchronization.
+
+        """
+        return sync_dir(
+            src_fs, src_path, self, dst_path,
+            delete=delete, checksum=checksum, workers=workers, dry_run=dry_run,
+            upload=True)
+
+    def sync_to(
+            self,
+            dst_fs,
+            src_path='/',
+            dst_path='/',
+            delete=False,
+            checksum=False,
+            workers=4,
+            dry_run=False,
+    ):
+        """Synchronize a directory of another filesystem from this filesystem.
+
+        This is the counterpart of `~SSHFS.sync_from`, downloading files
+        from ``src_path`` to ``dst_path`` in ``dst_fs``.
+
+        Arguments:
+            dst_fs (fs.base.FS): The filesystem to copy files to.
+            src_path (str): The path to the directory of this filesystem to
+                copy files from.
+            dst_path (str): The path to the destination directory in
+                ``dst_fs``, created if it does not exist.
+            delete (bool): Set to `True` to remove the resources below
+                ``dst_path`` that are not in the source directory.
+            checksum (bool): Set to `True` to compare the SHA-256 of files
+                of the same size instead of their modification times.
+            workers (int): The number of files copied concurrently.
+            dry_run (bool): Set to `True` to only plan the operations,
+                without changing anything.
+
+        Returns:
+            fs.sshfs.sync.SyncStats: the operations and statistics of the
+            synchronization.
+
+        """
+        return sync_dir(
+            self, src_path, dst_fs, dst_path,
+            delete=delete, checksum=checksum, workers=workers, dry_run=dry_run,
+            upload=False)
+
+    def download_tree(self, dst_fs, src_path='/', dst_path='/', compression=None, workers=4):
+        """Download a directory tree to another filesystem.
+
+        On POSIX servers, the whole tree is streamed as a single archive
+        created by a remote ``tar`` command, instead of opening and stating
+        every file over SFTP, which makes copying many small files much
+        faster. Other servers fall back to copying files concurrently over
+        several SFTP sessions.
+
+        Only directories and regular files are copied, along with their
+        modification times.
+
+        Arguments:
+            dst_fs (fs.base.FS): The filesystem to copy files to.
+            src_path (str): The path to the directory of this filesystem
+                to copy files from.
+            dst_path (str): The path to the destination directory in
+                ``dst_fs``, created if it does not exist.
+            compression (str, optional): The compression of the archive,
+                either ``"gz"``, ``"bz2"`` or ``"xz"``, to trade CPU time
+                for bandwidth on slow networks, or `None`.
+            workers (int): The number of files copied concurrently when
+                ``tar`` is not available on the server.
+
+        Raises:
+            ValueError: If ``compression`` is not supported.
+            fs.errors.DirectoryExpected: If ``src_path`` is not a
+                directory.
+            fs.errors.OperationFailed: If the remote ``tar`` command
+                failed.
+
+        """
+        self.check()
+        _src_path = self.validatepath(src_path)
+        if compression not in _TAR_COMPRESSIONS:
+            raise ValueError("unsupported compression: {!r}".format(compression))
+        if not self.getinfo(_src_path).is_dir:
+            raise errors.DirectoryExpected(src_path)
+
+        if not self._tar:
+            dst_fs.makedirs(dst_path, recreate=True)
+            copy_dir(self, _src_path, dst_fs, dst_path, workers=workers, preserve_time=True)
+            return
+
+        cmd = 'tar -c{}f - -C {} .'.format(
+            _TAR_COMPRESSIONS[compression], shlex_quote(_src_path))
+
+        def stream(stdin, stdout):
+            read_tree(stdout, dst_fs, dst_path, compression)
+
+        self._tar_command(cmd, stream, 'download_tree', src_path)
+
+    def upload_tree(self, src_fs, src_path='/', dst_path='/', compression=None, workers=4):
+        """Upload a directory tree from another filesystem.
+
+        This is the counterpart of `~SSHFS.download_tree`, streaming the
+        tree as a single archive extracted by a remote ``tar`` command on
+        POSIX servers. Existing files are overwritten.
+
+        Arguments:
+            src_fs (fs.base.FS): The filesystem to copy files from.
+            src_path (str): The path to the source directory in ``src_fs``.
+            dst_path (str): The path to the directory of this filesystem to
+                copy files to, created if it does not exist.
+            compression (str, optional): The compression of the archive,
+                either ``"gz"``, ``"bz2"`` or ``"xz"``, to trade CPU time
+                for bandwidth on slow networks, or `None`.
+            workers (int): The number of files copied concurrently when
+                ``tar`` is not available on the server.
+
+        Raises:
+            ValueError: If ``compression`` is not supported.
+            fs.errors.DirectoryExpected: If ``src_path`` is not a
+                directory.
+            fs.errors.OperationFailed: If the remote ``tar`` command
+                failed.
+
+        """
+        self.check()
+        _dst_path = self.validatepath(dst_path)
+        if compression not in _TAR_COMPRESSIONS:
+            raise ValueError("unsupported compression: {!r}".format(compression))
+        if not src_fs.getinfo(src_path).is_dir:
+            raise errors.DirectoryExpected(src_path)
+
+        self.makedirs(_dst_path, recreate=True)
+        if not self._tar:
+            copy_dir(src_fs, src_path, self, _dst_path, workers=workers, preserve_time=True)
+            return
+
+        cmd = 'tar -x{}f - --no-same-owner -C {}'.format(
+            _TAR_COMPRESSIONS[compression], shlex_quote(_dst_path))
+
+        def stream(stdin, stdout):
+            write_tree(src_fs, src_path, stdin, compression)
+            stdin.flush()
+            stdin.channel.shutdown_write()
+
+        try:
+            self._tar_command(cmd, stream, 'upload_tree', dst_path)
+        finally:
+            self._cache.invalidate(_dst_path, recursive=True)
+
+    def batch(self, workers=4):
+        """Get an executor running operations on many resources concurrently.
+
+        The executor has methods to remove, make, move, set the info of,
+        or open many resources at once, e.g.
+        ``ssh_fs.batch(workers=16).remove(paths)``. Operations are spread
+        across ``workers`` threads, each using its own SFTP session from
+        the pool, and the result or the error of each item is returned.
+        To get the info of many resources, use `~SSHFS.getinfo_many`,
+        which pipelines requests over a single session instead.
+
+        Arguments:
+            workers (int): The number of operations run concurrently.
+                Sessions checked out beyond ``pool_size`` are closed once
+                each batch of operations completes.
+
+        Returns:
+            fs.sshfs.batch.SSHBatch: the executor.
+
+        """
+        self.check()
+        return SSHBatch(self, workers)
+
+    def invalidate_names(self):
+        """Clear the cached user and group names.
+
+        The names will be listed again from the server the next time
+        the ``access`` namespace is requested.
+        """
+        with self._names_lock:
+            self._names_expiry = 0
+            self._names = {}
+
+    def invalidate_cache(self, path=None):
+        """Clear the cached metadata of a resource.
+
+        Arguments:
+            path (str, optional): The path of the resource to forget, along
+                with all the resources below it. If `None` is given, the
+                metadata of all resources is cleared.
+
+        """
+        if path is None:
+            self._cache.clear()
+        else:
+            self._cache.invalidate(self.validatepath(path), recursive=True)
 
     @cached_property
     def platform(self):
@@ -513,15 +1691,484 @@ class SSHFS(FS):
                 return locale.split(b'.')[-1].decode('ascii').lower()
         return None
 
+    def _copy_data(self, src_path, dst_path):
+        """Copy a file on the server with the ``copy-data`` extension.
+
+        Returns:
+            bool: `True` if the file was copied, `False` if the server
+            does not support the extension.
+        """
+        with self._session() as sftp:
+            if 'copy-data' not in sftp.extensions:
+                return False
+            with sftp.open(src_path, 'rb') as src, \
+                    sftp.open(dst_path, 'wb') as dst:
+                try:
+                    # a length of zero copies until the end of the file
+                    sftp.extended(
+                        'copy-data',
+                        src.handle, int64(0), int64(0),
+                        dst.handle, int64(0),
+                    )
+                except IOError as err:
+                    if err.errno != errno.EOPNOTSUPP:
+                        raise
+                    return False
+        return True
+
+    def _copy_command(self, src_path, dst_path, recursive=False, preserve_time=False):
+        """Copy a resource on the server with the ``cp`` command.
+
+        Reflinks are used where the remote filesystem supports them,
+        so that the data is not even duplicated on the server.
+
+        Returns:
+            bool: `True` if the resource was copied, `False` if the
+            command failed or the server is not a POSIX system.
+        """
+        if self.platform not in _POSIX_PLATFORMS:
+            return False
+        args = [shlex_quote(src_path), shlex_quote(dst_path)]
+        if preserve_time:
+            args.insert(0, '-p')
+        if recursive:
+            args.insert(0, '-R')
+        cmd = 'cp {}'.format(' '.join(args))
+        if self.platform == 'linux':
+            cmd = 'cp --reflink=auto {} 2>/dev/null || {}'.format(' '.join(args), cmd)
+        return self._exec_command(cmd) is not None
+
+    def _remove_command(self, path):
+        """Remove a directory tree on the server with the ``rm`` command.
+
+        As with `~fs.base.FS.removetree`, only the contents of the root
+        directory are removed.
+
+        Returns:
+            bool: `True` if the tree was removed, `False` if the command
+            failed or the server is not a POSIX system.
+        """
+        if self.platform not in _POSIX_PLATFORMS:
+            return False
+        if path == '/':
+            cmd = 'cd {} && rm -rf -- * .[!.]* ..?*'.format(shlex_quote(path))
+        else:
+            cmd = 'rm -rf -- {}'.format(shlex_quote(path))
+        return self._exec_command(cmd) is not None
+
+    def _remove_pipelined(self, path, window=64):
+        """Remove a directory tree with pipelined SFTP requests.
+
+        The tree is listed first, then all files are removed while keeping
+        up to ``window`` requests in flight, and finally the directories
+        are removed one depth level at a time, deepest first.
+        """
+        with self._session() as sftp:
+            levels, files = [[path]], []
+            while levels[-1]:
+                subdirs = []
+                for dirpath in levels[-1]:
+                    for attr in sftp.listdir_attr(dirpath):
+                        entry = join(dirpath, attr.filename)
+                        if stat.S_ISDIR(attr.st_mode):
+                            subdirs.append(entry)
+                        else:
+                            files.append(entry)
+                levels.append(subdirs)
+            # the root directory itself is never removed
+            if path == '/':
+                levels.pop(0)
+            batches = [(CMD_REMOVE, files)]
+            batches.extend((CMD_RMDIR, level) for level in reversed(levels))
+            for cmd, paths in batches:
+                requests = ((cmd, entry) for entry in paths)
+                # wait for all responses before reporting the first error
+                responses = list(sftp.pipeline(requests, window))
+                for entry, response in zip(paths, responses):
+                    if isinstance(response, Exception):
+                        with convert_sshfs_errors('removetree', entry):
+                            raise response
+
+    @contextlib.contextmanager
+    def _session(self):
+        """Get an SFTP session for the duration of a ``with`` block.
+
+        A `paramiko.SFTPClient` cannot wait for the responses of several
+        requests from different threads, so the main session is only used
+        while no other thread is using it. Concurrent operations get a
+        session from the pool instead, which lets them run in parallel.
+        """
+        pinned = getattr(self._local, 'sftp', None)
+        if pinned is not None and not pinned.sock.closed:
+            yield pinned
+        elif self._sftp_lock.acquire(False):
+            try:
+                yield self._sftp
+            finally:
+                self._sftp_lock.release()
+        else:
+            with self._pool.session() as sftp:
+                yield sftp
+
+    @contextlib.contextmanager
+    def _pinned_session(self):
+        """Use a single session for the operations of the current thread.
+
+        The session is checked out from the pool for the duration of a
+        ``with`` block, during which `SSHFS._session` always returns it in
+        this thread, so that a worker running many operations does not
+        need to check out a session for each of them.
+        """
+        try:
+            sftp = self._pool.acquire()
+        except (errors.FSError, paramiko.SSHException):
+            # the operations will report the error themselves
+            yield None
+            return
+        self._local.sftp = sftp
+        try:
+            yield sftp
+        finally:
+            self._local.sftp = None
+            self._pool.release(sftp)
+
+    @cached_property
+    def _tar(self):
+        """Whether the ``tar`` command is available on the server.
+        """
+        if self.platform not in _POSIX_PLATFORMS:
+            return False
+        return bool(self._exec_command('command -v tar'))
+
+    def _tar_command(self, cmd, stream, op, path):
+        """Run a ``tar`` command on the server, streaming the archive.
+
+        Arguments:
+            cmd (str): The command to run.
+            stream (callable): A function called with the standard input
+                and output of the command, which writes the archive to the
+                former or reads it from the latter.
+            op (str): The name of the operation, for error messages.
+            path (str): The path of the operation, for error messages.
+
+        Raises:
+            fs.errors.OperationFailed: If the command failed.
+
+        """
+        with convert_sshfs_errors(op, path):
+            stdin, stdout, stderr = self._client.exec_command(
+                cmd, timeout=self._exec_timeout)
+        channel = stdout.channel
+        # warnings, e.g. about unreadable files, must not stall the archive
+        errors_output = self._drain(stderr)
+        try:
+            with convert_sshfs_errors(op, path):
+                try:
+                    stream(stdin, stdout)
+                except tarfile.TarError as err:
+                    # the archive is truncated if the command failed
+                    message = "{} failed: {}".format(op, err)
+                    six.raise_from(errors.OperationFailed(path, exc=err, msg=message), err)
+                status = channel.recv_exit_status()
+                output = (errors_output() or b'').decode('utf-8', 'replace').strip()
+        finally:
+            # closing the channel also stops the thread draining it
+            channel.close()
+            errors_output()
+        if status != 0:
+            message = "{} failed: {}".format(op, output or "exit status {}".format(status))
+            raise errors.OperationFailed(path, msg=message)
+
+    @staticmethod
+    def _drain(pipe):
+        """Read a pipe of a command to the end in a separate thread.
+
+        Both pipes of a command share the flow control window of the
+        channel, so one of them must be drained while the other is read:
+        otherwise, a command writing more than the window to the pipe
+        that is not being read would block until the timeout.
+
+        Returns:
+            callable: a function waiting for the pipe to be read, and
+            returning its content, or `None` if reading it failed.
+        """
+        content = []
+        thread = threading.Thread(target=lambda: content.append(pipe.read()))
+        thread.daemon = True
+        thread.start()
+
+        def join():
+            thread.join()
+            return content[0] if content else None
+
+        return join
+
     def _exec_command(self, cmd):
         """Run a command on the remote SSH server.
 
         Returns:
             bytes: the output of the command, if it didn't fail
-            None: if the error pipe of the command was not empty
+            None: if the command exited with a non-zero status, or if its
+            error pipe was not empty
+
+        Raises:
+            paramiko.ssh_exception.SSHException: if the command could not
+                be started.
+            socket.timeout: if the command did not complete before the
+                ``exec_timeout``.
         """
         _, out, err = self._client.exec_command(cmd, timeout=self._exec_timeout)
-        return out.read().strip() if not err.read().strip() else None
+        errors_output = self._drain(err)
+        try:
+            output = out.read()
+        except Exception:
+            # stop the command, which also interrupts the other thread
+            out.channel.close()
+            raise
+        finally:
+            stderr = errors_output()
+        if out.channel.recv_exit_status() != 0 or stderr is None or stderr.strip():
+            return None
+        return output.strip()
+
+    def _stat(self, path):
+        """Get the stat result of a resource, using the cache if possible.
+        """
+        _stat = self._cache.get(path)
+        if _stat is None:
+            with self._session() as sftp:
+                _stat = sftp.stat(path)
+            self._cache.put(path, _stat)
+        return _stat
+
+    def _find_tree(self, path, namespaces=None, max_depth=None):
+        """List a directory tree with a single ``find`` command.
+
+        Only GNU ``find`` supports the ``-printf`` action, so this is only
+        attempted on Linux and Cygwin servers.
+
+        Returns:
+            dict: a mapping of directory paths, relative to ``path``, to the
+            `Info` objects of their entries, or `None` if the tree could
+            not be listed, or if ``namespaces`` contains namespaces that
+            cannot be obtained from ``find``.
+        """
+        namespaces = namespaces or ()
+        if not set(namespaces).issubset(_FIND_NAMESPACES):
+            return None
+        if self.platform not in ("linux", "cygwin"):
+            return None
+        _path = self.validatepath(path)
+        cmd = "find {} -mindepth 1{} -printf '{}'".format(
+            shlex_quote(_path),
+            '' if max_depth is None else ' -maxdepth {:d}'.format(max_depth),
+            _FIND_FORMAT,
+        )
+        output = self._exec_command(cmd)
+        if output is None:
+            return None
+
+        listing = {}
+        for entry in output.split(b'\0'):
+            if not entry:
+                continue
+            _type, size, mtime, atime, mode, uid, gid, relpath = \
+                entry.split(b' ', 7)
+            _stat = paramiko.SFTPAttributes()
+            _stat.st_mode = _FIND_TYPES.get(_type, 0) | int(mode, 8)
+            _stat.st_size = int(size)
+            _stat.st_mtime = int(float(mtime))
+            _stat.st_atime = int(float(atime))
+            _stat.st_uid = int(uid)
+            _stat.st_gid = int(gid)
+            parent, name = split(relpath.decode('utf-8'))
+            listing.setdefault(parent, []).append(
+                Info(self._make_raw_info(name, _stat, namespaces))
+            )
+        return listing
+
+    def _getinfo_batch(self, paths, namespaces, lstat, window):
+        """Get the info of a batch of paths with pipelined requests.
+        """
+        results = []
+        for path in paths:
+            try:
+                _path = self.validatepath(path)
+            except (errors.FSError, errors.IllegalBackReference) as err:
+                results.append([path, err, None, None])
+            else:
+                results.append([path, _path, self._cache.get(_path), None])
+
+        requests, slots = [], []
+        for result in results:
+            if isinstance(result[1], Exception):
+                continue
+            if result[2] is None:
+                requests.append((CMD_STAT, result[1]))
+                slots.append((result, 2))
+            if lstat:
+                requests.append((CMD_LSTAT, result[1]))
+                slots.append((result, 3))
+
+        # a lost connection fails the whole batch, unlike error statuses
+        with convert_sshfs_errors('getinfo', paths[0]), self._session() as sftp:
+            responses = sftp.pipeline(requests, window)
+            for (result, index), response in zip(slots, responses):
+                if isinstance(response, Exception):
+                    result[index] = response
+                else:
+                    result[index] = paramiko.SFTPAttributes._from_msg(response[1])
+                    if index == 2:
+                        self._cache.put(result[1], result[index])
+
+        for path, _path, _stat, _lstat in results:
+            try:
+                with convert_sshfs_errors('getinfo', path):
+                    for error in (_path, _stat, _lstat):
+                        if isinstance(error, Exception):
+                            raise error
+                    info = self._make_raw_info(basename(_path), _stat, namespaces)
+                    if "lstat" in namespaces:
+                        info["lstat"] = {
+                            k: getattr(_lstat, k)
+                            for k in dir(_lstat)
+                            if k.startswith("st_")
+                        }
+                    if "link" in namespaces:
+                        info["link"] = {"target": None}
+                        if OSFS._get_type_from_stat(_lstat) == ResourceType.symlink:
+                            with self._session() as sftp:
+                                info["link"]["target"] = sftp.readlink(_path)
+            except (errors.FSError, errors.IllegalBackReference) as err:
+                yield err
+            else:
+                yield Info(info)
+
+    def _hash_batch(self, paths, name):
+        """Get the hashes of a batch of files.
+        """
+        results = []
+        for path in paths:
+            try:
+                results.append(self.validatepath(path))
+            except (errors.FSError, errors.IllegalBackReference) as err:
+                results.append(err)
+        pending = [
+            i for i, _path in enumerate(results)
+            if not isinstance(_path, Exception)
+        ]
+
+        if pending and name in _HASH_COMMANDS and self.platform in _POSIX_PLATFORMS:
+            # hash each file from the standard input, so that the output
+            # has exactly one line per file even when a file cannot be read
+            cmd = 'for f in {}; do {} 2>/dev/null <"$f" || echo -; done'.format(
+                " ".join(shlex_quote(results[i]) for i in pending),
+                _HASH_COMMANDS[name],
+            )
+            try:
+                output = self._exec_command(cmd)
+            except paramiko.ssh_exception.SSHException:
+                output = None
+            lines = output.split(b'\n') if output is not None else []
+            if len(lines) == len(pending):
+                size = hashlib.new(name).digest_size * 2
+                for i, line in zip(list(pending), lines):
+                    digest = line.split(b' ', 1)[0]
+                    if len(digest) == size and digest.strip(b'0123456789abcdef') == b'':
+                        results[i] = digest.decode('ascii')
+                        pending.remove(i)
+
+        for i in pending:
+            digest = None
+            if name in _CHECK_FILE_HASHES:
+                digest = self._check_file(results[i], name)
+                if digest is not None:
+                    digest = binascii.hexlify(digest).decode('ascii')
+            if digest is None:
+                # let the default implementation raise the expected errors
+                try:
+                    digest = super(SSHFS, self).hash(results[i], name)
+                except errors.FSError as err:
+                    digest = err
+            results[i] = digest
+        return results
+
+    def _check_file(self, path, name, block_size=0):
+        """Hash a file with the ``check-file`` SFTP extension.
+
+        The file is hashed with a ``check-file-name`` request, so that
+        it does not need to be opened first.
+
+        Returns:
+            bytes: the digest of the file, or the concatenated digests of
+            its blocks if ``block_size`` is not 0, or `None` if the server
+            could not hash it with the ``name`` algorithm.
+        """
+        with self._session() as sftp:
+            if not {'check-file', 'check-file-name'}.intersection(sftp.extensions):
+                return None
+            try:
+                _, msg = sftp.receive(sftp.send(
+                    CMD_EXTENDED,
+                    'check-file-name',
+                    path,
+                    name,
+                    int64(0),
+                    int64(0),
+                    block_size,
+                ))
+            except IOError:
+                return None
+        # the reply names the extension, then the algorithm that was used
+        if msg.get_text() != 'check-file' or msg.get_text() != name:
+            return None
+        return msg.get_remainder()
+
+    def _block_hashes(self, path, block_size):
+        """Get the MD5 of each block of a remote file, computed on the server.
+
+        Returns:
+            list: the digests of the consecutive blocks of ``block_size``
+            bytes of the file, or `None` if the server could not hash them,
+            e.g. when the hashing command failed or timed out.
+        """
+        digests = self._check_file(path, 'md5', block_size)
+        if digests is not None:
+            return [digests[i:i + 16] for i in six.moves.range(0, len(digests), 16)]
+        if self.platform not in _POSIX_PLATFORMS:
+            return None
+        # GNU `split` can pipe every block of the file to a command
+        cmd = 'split -b {} --filter=md5sum -- {}'.format(block_size, shlex_quote(path))
+        try:
+            output = self._exec_command(cmd)
+        except (paramiko.ssh_exception.SSHException, EnvironmentError):
+            # `socket.timeout` is an `EnvironmentError` as well
+            return None
+        if output is None:
+            return None
+        try:
+            return [
+                binascii.unhexlify(line.split(b' ', 1)[0])
+                for line in output.splitlines()
+            ]
+        except (binascii.Error, TypeError):
+            return None
+
+    def _add_hashes(self, infos, paths):
+        """Add the ``hash`` namespace to the info of files.
+        """
+        files = [
+            (info, path) for info, path in zip(infos, paths)
+            if isinstance(info, Info)
+        ]
+        for info, _ in files:
+            info.raw["hash"] = {_HASH_NAMESPACE: None}
+        files = [(info, path) for info, path in files if info.is_file]
+        digests = self.hash_many([path for _, path in files], _HASH_NAMESPACE)
+        for (info, _), digest in zip(files, digests):
+            if not isinstance(digest, Exception):
+                info.raw["hash"][_HASH_NAMESPACE] = digest
+        return infos
 
     def _make_raw_info(self, name, stat_result, namespaces):
         """Create an `Info` object from a stat result.
@@ -568,19 +2215,84 @@ class SSHFS(FS):
         access['uid'] = stat_result.st_uid
 
         if self.platform in ("linux", "darwin", "freebsd"):
-            def entry_name(db, _id):
-                entry = self._exec_command('getent {} {}'.format(db, _id))
-                name = next(iter(entry.split(b':')))
-                return name.decode(self.locale or 'utf-8')
-            access['group'] = entry_name('group', access['gid'])
-            access['user'] = entry_name('passwd', access['uid'])
+            access['group'] = self._get_name('group', access['gid'])
+            access['user'] = self._get_name('passwd', access['uid'])
 
         return access
 
+    def _get_name(self, db, _id):
+        """Get the name of a user or a group from its numerical id.
+
+        All the entries of the ``passwd`` and ``group`` databases are
+        listed in a single command and cached for ``names_ttl`` seconds.
+        Entries missing from the listing (e.g. when the name service does
+        not support enumeration, or when listing it failed or timed out)
+        are looked up individually.
+
+        Returns:
+            str: the name of the entry, or `None` if it could not be found.
+        """
+        # the remote commands are run without holding the lock, so that
+        # a slow name service does not block the other threads
+        with self._names_lock:
+            expired = time.time() >= self._names_expiry
+        if expired:
+            listing = self._list_names()
+            with self._names_lock:
+                self._names = listing
+                self._names_expiry = time.time() + self._names_ttl
+        with self._names_lock:
+            names = self._names.setdefault(db, {})
+            if _id in names:
+                return names[_id]
+        name = None
+        try:
+            entry = self._exec_command('getent {} {}'.format(db, _id))
+        except (paramiko.ssh_exception.SSHException, EnvironmentError):
+            # only the numerical id will be available
+            entry = None
+        if entry:
+            name = next(iter(entry.split(b':')))
+            name = name.decode(self.locale or 'utf-8')
+        with self._names_lock:
+            return self._names.setdefault(db, {}).setdefault(_id, name)
+
+    def _list_names(self):
+        """List the names of all users and groups on the remote server.
+
+        Returns:
+            dict: a dictionary mapping ``passwd`` and ``group`` to
+            dictionaries of names indexed by numerical id.
+        """
+        names = {'passwd': {}, 'group': {}}
+        try:
+            output = self._exec_command(
+                "getent passwd; echo '{}'; getent group".format(_NAMES_SEPARATOR)
+            )
+        except (paramiko.ssh_exception.SSHException, EnvironmentError):
+            # e.g. a timeout while enumerating a large LDAP directory
+            output = None
+        if output is not None:
+            db = 'passwd'
+            for line in output.splitlines():
+                # entries always contain colons, so they cannot be
+                # mistaken for the separator line
+                if line.strip() == _NAMES_SEPARATOR.encode('ascii'):
+                    db = 'group'
+                    continue
+                fields = line.split(b':')
+                if len(fields) > 2 and fields[2].isdigit():
+                    names[db].setdefault(
+                        int(fields[2]),
+                        fields[0].decode(self.locale or 'utf-8'),
+                    )
+        return names
+
     def _chmod(self, path, mode):
         """Change the *mode* of a resource.
         """
-        self._sftp.chmod(path, mode)
+        with self._session() as sftp:
+            sftp.chmod(path, mode)
 
     def _chown(self, path, uid, gid):
         """Change the *owner* of a resource.
@@ -589,7 +2301,8 @@ class SSHFS(FS):
             info = self.getinfo(path, namespaces=('access',))
             uid = uid or info.get('access', 'uid')
             gid = gid or info.get('access', 'gid')
-        self._sftp.chown(path, uid, gid)
+        with self._session() as sftp:
+            sftp.chown(path, uid, gid)
 
     def _utime(self, path, modified, accessed):
         """Set the *accessed* and *modified* times of a resource.
@@ -597,6 +2310,8 @@ class SSHFS(FS):
         if accessed is not None or modified is not None:
             accessed = float(modified if accessed is None else accessed)
             modified = float(accessed if modified is None else modified)
-            self._sftp.utime(path, (accessed, modified))
+            with self._session() as sftp:
+                sftp.utime(path, (accessed, modified))
         else:
-            self._sftp.utime(path, None)
+            with self._session() as sftp:
+                sftp.utime(path, None)
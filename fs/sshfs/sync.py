@@ -0,0 +1,256 @@
+# coding: utf-8
+"""Synchronization of directory trees between filesystems.
+"""
+from __future__ import unicode_literals
+from __future__ import absolute_import
+
+from concurrent.futures import ThreadPoolExecutor
+
+from ..path import abspath, dirname, frombase, join, normpath, relpath
+
+
+class SyncStats(object):
+    """The plan and statistics of a synchronization.
+
+    Attributes:
+        actions (list): The ``(action, path)`` pairs of the plan, in the
+            order they are run, where ``action`` is one of ``"remove"``,
+            ``"makedir"``, ``"create"`` or ``"update"``, and ``path`` is
+            relative to the synchronized directories.
+        created (int): The number of files created.
+        updated (int): The number of files updated.
+        unchanged (int): The number of files left unchanged.
+        removed (int): The number of files and directories removed.
+        directories (int): The number of directories created.
+        transferred (int): The number of bytes copied.
+        dry_run (bool): Whether the plan was only computed, in which
+            case the statistics are the ones the synchronization would
+            have had.
+
+    """
+
+    def __init__(self, dry_run=False):  # noqa: D107
+        self.actions = []
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.directories = 0
+        self.transferred = 0
+        self.dry_run = dry_run
+
+    def __repr__(self):  # noqa: D105
+        return (
+            "SyncStats(created={}, updated={}, unchanged={}, removed={}, "
+            "directories={}, transferred={}, dry_run={})"
+        ).format(
+            self.created,
+            self.updated,
+            self.unchanged,
+            self.removed,
+            self.directories,
+            self.transferred,
+            self.dry_run,
+        )
+
+
+def _snapshot(fs, path):
+    """Get the info of all the resources below ``path``.
+
+    The tree is listed with ``fs.walk``, which lists a whole `SSHFS` tree
+    with a single command when possible, and scans its directories one by
+    one when the command fails.
+
+    Returns:
+        dict: the info of each resource, by path relative to ``path``.
+    """
+    if not fs.isdir(path):
+        return {}
+    base = abspath(normpath(path))
+    return {
+        relpath(frombase(base, _path)): info
+        for _path, info in fs.walk.info(base, namespaces=["details"])
+    }
+
+
+def _within(path, directories):
+    """Check whether a parent directory of ``path`` is in ``directories``.
+    """
+    parent = dirname(path)
+    while parent:
+        if parent in directories:
+            return True
+        parent = dirname(parent)
+    return False
+
+
+def _modified(info):
+    modified = info.raw["details"].get("modified")
+    # SFTP timestamps only have a resolution of one second
+    return None if modified is None else int(modified)
+
+
+def _hashes(fs, paths, name):
+    """Hash several files, with a single command on an `SSHFS`.
+    """
+    hash_many = getattr(fs, "hash_many", None)
+    if hash_many is not None:
+        return list(hash_many(paths, name))
+    results = []
+    for path in paths:
+        try:
+            results.append(fs.hash(path, name))
+        except Exception as err:
+            results.append(err)
+    return results
+
+
+def _plan(src_fs, src_path, dst_fs, dst_path, delete, checksum, stats):
+    """Compare the trees and add the actions to run to ``stats``.
+
+    Returns:
+        list: the ``(path, info)`` pairs of the files to copy.
+    """
+    source = _snapshot(src_fs, src_path)
+    target = _snapshot(dst_fs, dst_path)
+
+    # resources to remove: extraneous ones, or ones of the wrong type
+    removed = set()
+    for path in sorted(target):
+        if _within(path, removed):
+            # removed along with its parent directory
+            target.pop(path)
+            continue
+        info = source.get(path)
+        if info is None and not delete:
+            continue
+        if info is None or info.is_dir != target[path].is_dir:
+            removed.add(path)
+            stats.actions.append(("remove", path))
+            stats.removed += 1
+            target.pop(path)
+
+    for path in sorted(source):
+        if source[path].is_dir and path not in target:
+            stats.actions.append(("makedir", path))
+            stats.directories += 1
+
+    # files to copy: missing ones, or ones differing in size or content
+    copies, compare = [], []
+    for path in sorted(source):
+        info = source[path]
+        if info.is_dir:
+            continue
+        other = target.get(path)
+        if other is None:
+            copies.append(("create", path, info))
+        elif info.size != other.size:
+            copies.append(("update", path, info))
+        elif checksum:
+            compare.append(path)
+        elif _modified(info) is None or _modified(info) != _modified(other):
+            copies.append(("update", path, info))
+        else:
+            stats.unchanged += 1
+    if compare:
+        src_hashes = _hashes(src_fs, [join(src_path, p) for p in compare], "sha256")
+        dst_hashes = _hashes(dst_fs, [join(dst_path, p) for p in compare], "sha256")
+        for path, src_hash, dst_hash in zip(compare, src_hashes, dst_hashes):
+            if isinstance(src_hash, Exception) or src_hash != dst_hash:
+                copies.append(("update", path, source[path]))
+            else:
+                stats.unchanged += 1
+
+    for action, path, info in copies:
+        stats.actions.append((action, path))
+        if action == "create":
+            stats.created += 1
+        else:
+            stats.updated += 1
+        stats.transferred += info.size
+    return [(path, info) for _, path, info in copies]
+
+
+def _copy(src_fs, src_path, dst_fs, dst_path, info, upload):
+    """Copy a file, along with its modification time.
+    """
+    if upload:
+        with src_fs.openbin(src_path) as src_file:
+            dst_fs.upload(dst_path, src_file)
+    else:
+        with dst_fs.openbin(dst_path, "w") as dst_file:
+            src_fs.download(src_path, dst_file)
+    details = info.raw["details"]
+    dst_fs.setinfo(dst_path, {
+        "details": {
+            "modified": details.get("modified"),
+            "accessed": details.get("accessed"),
+        }
+    })
+
+
+def sync_dir(
+        src_fs,
+        src_path,
+        dst_fs,
+        dst_path,
+        delete=False,
+        checksum=False,
+        workers=4,
+        dry_run=False,
+        upload=True,
+):
+    """Synchronize a directory with the content of another one.
+
+    Both trees are listed once, and compared to plan the operations needed
+    for the destination to mirror the source: files missing from the
+    destination, or whose size or modification time differ, are copied,
+    and resources of the wrong type are replaced. Files are then copied
+    concurrently by several workers.
+
+    Arguments:
+        src_fs (fs.base.FS): The source filesystem.
+        src_path (str): The path to the source directory.
+        dst_fs (fs.base.FS): The destination filesystem.
+        dst_path (str): The path to the destination directory, created
+            if it does not exist.
+        delete (bool): Set to `True` to remove the resources of the
+            destination that are not in the source.
+        checksum (bool): Set to `True` to compare the SHA-256 of files of
+            the same size instead of their modification times.
+        workers (int): The number of files copied concurrently.
+        dry_run (bool): Set to `True` to only plan the operations,
+            without changing the destination.
+        upload (bool): Set to `True` to copy files with the ``upload``
+            method of ``dst_fs``, or to `False` to copy them with the
+            ``download`` method of ``src_fs``, so that the transfers of
+            the remote filesystem are used.
+
+    Returns:
+        SyncStats: the operations and statistics of the synchronization.
+
+    """
+    stats = SyncStats(dry_run)
+    copies = _plan(src_fs, src_path, dst_fs, dst_path, delete, checksum, stats)
+    if dry_run:
+        return stats
+
+    dst_fs.makedirs(dst_path, recreate=True)
+    for action, path in stats.actions:
+        _path = join(dst_path, path)
+        if action == "remove":
+            if dst_fs.isdir(_path):
+                dst_fs.removetree(_path)
+            else:
+                dst_fs.remove(_path)
+        elif action == "makedir":
+            dst_fs.makedir(_path, recreate=True)
+
+    def copy(item):
+        path, info = item
+        _copy(src_fs, join(src_path, path), dst_fs, join(dst_path, path), info, upload)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for _ in executor.map(copy, copies):
+            pass
+    return stats
@@ -0,0 +1,219 @@
+# coding: utf-8
+"""Parallel transfers over several SFTP sessions.
+"""
+from __future__ import unicode_literals
+from __future__ import absolute_import
+
+import threading
+
+import six
+from concurrent.futures import ThreadPoolExecutor
+from paramiko.sftp import CMD_WRITE, int64
+from paramiko.sftp_file import SFTPFile
+
+#: The default size of the byte ranges transferred by each worker.
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class _Progress(object):
+    """Report the progress of a transfer shared between several workers.
+    """
+
+    def __init__(self, total, callback=None, transferred=0):
+        self.total = total
+        self.transferred = transferred
+        self.callback = callback
+        self.failed = threading.Event()
+        self.lock = threading.Lock()
+
+    def update(self, count):
+        with self.lock:
+            self.transferred += count
+            if self.callback is not None:
+                self.callback(self.transferred, self.total)
+
+
+def _ranges(start, stop, chunk_size):
+    queue = six.moves.queue.Queue()
+    for offset in six.moves.range(start, stop, chunk_size):
+        queue.put((offset, min(chunk_size, stop - offset)))
+    return queue
+
+
+def _run(worker, ranges, workers, progress):
+    count = min(workers, ranges.qsize())
+    with ThreadPoolExecutor(max_workers=max(count, 1)) as executor:
+        futures = [executor.submit(worker) for _ in six.moves.range(count)]
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            progress.failed.set()
+            raise
+
+
+def download_ranges(
+        pool,
+        path,
+        file,
+        size,
+        chunk_size=None,
+        callback=None,
+        workers=4,
+        offset=0,
+):
+    """Download a remote file by fetching byte ranges concurrently.
+
+    Each worker checks out its own session from ``pool`` and opens the
+    remote file, then fetches ranges of ``chunk_size`` bytes and writes them
+    at their offset into ``file``, relative to its current position. If
+    the download fails, ``file`` is truncated after the last range that
+    was downloaded along with all the ranges before it, so that the
+    download can be resumed from there.
+
+    Arguments:
+        pool (fs.sshfs.pool.SFTPPool): The pool to get SFTP sessions from.
+        path (str): The path to the remote file.
+        file (io.IOBase): A seekable file-like object open for writing
+            in binary mode.
+        size (int): The size of the remote file.
+        chunk_size (int, optional): The size of the ranges fetched by
+            each worker, or `None` to use `DEFAULT_CHUNK_SIZE`.
+        callback (callable, optional): A function (form: ``func(int, int)``)
+            called with the bytes transferred so far and the total bytes
+            to be transferred.
+        workers (int): The number of concurrent workers, at most the
+            ``max_sessions`` of ``pool``.
+        offset (int): The offset to start downloading from, the previous
+            bytes being already in ``file``.
+
+    """
+    workers = min(workers, pool.max_sessions or workers)
+    base = file.tell()
+    ranges = _ranges(offset, size, chunk_size or DEFAULT_CHUNK_SIZE)
+    progress = _Progress(size, callback, offset)
+    done = {}
+    if offset and callback is not None:
+        callback(offset, size)
+
+    def worker():
+        with pool.session() as sftp, sftp.open(path, 'rb') as handle:
+            while not progress.failed.is_set():
+                try:
+                    offset, length = ranges.get_nowait()
+                except six.moves.queue.Empty:
+                    return
+                data = b''.join(handle.readv([(offset, length)]))
+                with progress.lock:
+                    file.seek(base + offset)
+                    file.write(data)
+                    done[offset] = len(data)
+                progress.update(len(data))
+
+    try:
+        _run(worker, ranges, workers, progress)
+    except BaseException:
+        end = offset
+        while end in done:
+            end += done[end]
+        file.seek(base + end)
+        file.truncate()
+        raise
+    file.seek(base + size)
+
+
+def _write_range(handle, offset, data, window=64):
+    """Write ``data`` at ``offset`` with pipelined requests.
+
+    Returns once all the writes were acknowledged by the server.
+    """
+    size = SFTPFile.MAX_REQUEST_SIZE
+    requests = (
+        (CMD_WRITE, handle.handle, int64(offset + start), data[start:start + size])
+        for start in six.moves.range(0, len(data), size)
+    )
+    for response in handle.sftp.pipeline(requests, window):
+        if isinstance(response, Exception):
+            raise response
+
+
+def upload_ranges(
+        pool,
+        path,
+        file,
+        chunk_size=None,
+        callback=None,
+        file_size=None,
+        workers=4,
+        offset=0,
+):
+    """Upload a remote file by writing byte ranges concurrently.
+
+    The source file is read sequentially in ranges of ``chunk_size``
+    bytes, which are handed out to workers writing them at their offset
+    in the remote file, each over its own session from ``pool``. At most
+    one range per worker is kept in memory while waiting to be written.
+
+    Arguments:
+        pool (fs.sshfs.pool.SFTPPool): The pool to get SFTP sessions from.
+        path (str): The path to the remote file.
+        file (io.IOBase): A file-like object open for reading in binary
+            mode.
+        chunk_size (int, optional): The size of the ranges written by
+            each worker, or `None` to use `DEFAULT_CHUNK_SIZE`.
+        callback (callable, optional): A function (form: ``func(int, int)``)
+            called with the bytes transferred so far and ``file_size``.
+        file_size (int, optional): The size passed to ``callback``. If
+            `None` is given, uses ``0``.
+        workers (int): The number of concurrent workers, at most the
+            ``max_sessions`` of ``pool``.
+        offset (int): The offset to start uploading at, the remote file
+            already holding the bytes before it. The content of ``file``
+            is written from that offset, and the remote file is not
+            truncated.
+
+    Returns:
+        int: the size of the remote file after the upload.
+
+    """
+    workers = min(workers, pool.max_sessions or workers)
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    ranges = six.moves.queue.Queue(maxsize=workers)
+    progress = _Progress(file_size or 0, callback, offset)
+
+    if offset:
+        if callback is not None:
+            callback(offset, file_size or 0)
+    else:
+        # create (or truncate) the file before writing ranges into it
+        with pool.session() as sftp:
+            sftp.open(path, 'wb').close()
+
+    def worker():
+        try:
+            with pool.session() as sftp, sftp.open(path, 'r+b', 0) as handle:
+                for offset, data in iter(ranges.get, None):
+                    _write_range(handle, offset, data)
+                    progress.update(len(data))
+        except BaseException:
+            # keep consuming ranges so that the reader never blocks
+            progress.failed.set()
+            for _ in iter(ranges.get, None):
+                pass
+            raise
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(worker) for _ in six.moves.range(workers)]
+        try:
+            while not progress.failed.is_set():
+                data = file.read(chunk_size)
+                if not data:
+                    break
+                ranges.put((offset, data))
+                offset += len(data)
+        finally:
+            for _ in futures:
+                ranges.put(None)
+        for future in futures:
+            future.result()
+    return offset
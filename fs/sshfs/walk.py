@@ -0,0 +1,66 @@
+# coding: utf-8
+"""Implementation of `SSHWalker`.
+"""
+from __future__ import unicode_literals
+from __future__ import absolute_import
+
+import six
+from paramiko.ssh_exception import SSHException
+
+from ..path import join, normpath
+from ..walk import BoundWalker, Walker
+
+
+class SSHWalker(Walker):
+    """A walker listing the whole tree with a single remote command.
+
+    The default `~fs.walk.Walker` scans every directory separately, which
+    costs one round trip per directory. When the filesystem supports it,
+    this walker lists the whole tree once with ``find`` when the walk
+    starts, and then scans directories from that listing. It falls back
+    to the default behaviour otherwise, e.g. on non-GNU servers, when
+    some of the requested namespaces cannot be obtained from ``find``, or
+    when the command fails or times out.
+    """
+
+    def __init__(self, *args, **kwargs):  # noqa: D107
+        super(SSHWalker, self).__init__(*args, **kwargs)
+        self._listing = None
+
+    @classmethod
+    def bind(cls, fs):  # noqa: D102
+        # `Walker.bind` always binds a `Walker`, not the subclass
+        return BoundWalker(fs, cls)
+
+    @staticmethod
+    def _find(fs, path, namespaces, max_depth):
+        # unwrap filesystems such as `~fs.subfs.SubFS` to reach the SSHFS
+        while not hasattr(fs, '_find_tree') and hasattr(fs, 'delegate_path'):
+            fs, path = fs.delegate_path(path)
+        if not hasattr(fs, '_find_tree'):
+            return None
+        return fs._find_tree(path, namespaces, max_depth)
+
+    def _iter_walk(self, fs, path, namespaces=None):  # noqa: D102
+        try:
+            listing = self._find(fs, path, namespaces, self.max_depth)
+        except (SSHException, EnvironmentError):
+            # `socket.timeout` is an `EnvironmentError` as well
+            listing = None
+        if listing is not None and '' not in listing:
+            # nothing was listed below the root, which may not even be a
+            # directory (or may be a symlink to one, which `find` does not
+            # follow): let the default scan list it, or raise the errors
+            listing = None
+        self._listing = None
+        if listing is not None:
+            self._listing = {
+                normpath(join(path, rel)): infos
+                for rel, infos in six.iteritems(listing)
+            }
+        return super(SSHWalker, self)._iter_walk(fs, path, namespaces)
+
+    def _scan(self, fs, dir_path, namespaces=None):  # noqa: D102
+        if self._listing is not None:
+            return iter(self._listing.get(dir_path, ()))
+        return super(SSHWalker, self)._scan(fs, dir_path, namespaces)
@@ -1,5 +1,21 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import sys
+
 import setuptools
-setuptools.setup()
+from setuptools.command.build_py import build_py as _build_py
+
+
+class build_py(_build_py):
+    """Skip the modules using Python 3 only syntax on older versions.
+    """
+
+    def find_package_modules(self, package, package_dir):
+        modules = _build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 5):
+            modules = [m for m in modules if m[:2] != ("fs.sshfs", "aio")]
+        return modules
+
+
+setuptools.setup(cmdclass={"build_py": build_py})
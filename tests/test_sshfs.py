@@ -2,18 +2,30 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import hashlib
+import io
+import itertools
+import os
+import socket
 import stat
 import sys
+import threading
 import time
 import uuid
 import unittest
 
+import paramiko.sftp
 import paramiko.ssh_exception
+from concurrent import futures
 
 import fs.path
+import fs.walk
 import fs.test
 import fs.errors
 from fs.sshfs import SSHFS
+from fs.sshfs.archive import read_tree
+from fs.sshfs.pool import SFTPPool
+from fs.sshfs.sftp import SFTPClient
 from fs.subfs import ClosingSubFS
 from fs.permissions import Permissions
 
@@ -202,3 +214,758 @@ class TestSSHFS(fs.test.FSTestCases, unittest.TestCase):
         now = int(time.time())
         with utils.mock.patch("time.time", lambda: now):
             super(TestSSHFS, self).test_setinfo()
+
+    def test_openbin_pool(self):
+        self.fs.writebytes("foo", b"bar")
+        with self.fs.openbin("foo") as f:
+            sftp = f._f.sftp
+        with self.fs.openbin("foo") as f:
+            self.assertIs(f._f.sftp, sftp)
+            with self.fs.openbin("foo") as g:
+                self.assertIsNot(g._f.sftp, sftp)
+        self.assertFalse(sftp.sock.closed)
+
+    def test_pool_max_sessions(self):
+        ssh = self.fs.delegate_fs()
+        pool = SFTPPool(ssh._client, max_sessions=2, wait_timeout=0.5)
+        first, second = pool.acquire(), pool.acquire()
+        self.assertRaises(fs.errors.OperationTimeout, pool.acquire)
+        with futures.ThreadPoolExecutor(max_workers=1) as executor:
+            # acquiring a session beyond the limit waits for one to be released
+            pool._wait_timeout = None
+            future = executor.submit(pool.acquire)
+            self.assertRaises(futures.TimeoutError, future.result, timeout=0.2)
+            pool.release(first)
+            self.assertIs(future.result(timeout=5), first)
+        pool.release(first)
+        pool.release(second)
+        pool.close()
+
+    def test_access_names_cache(self):
+        for i in range(5):
+            self.fs.touch("file{}".format(i))
+        ssh = self.fs.delegate_fs()
+        ssh.platform, ssh.locale
+        ssh.invalidate_names()
+        with utils.mock.patch.object(
+            ssh, '_exec_command', wraps=ssh._exec_command
+        ) as _exec_command:
+            infos = list(self.fs.scandir("/", namespaces=["access"]))
+            self.assertEqual(_exec_command.call_count, 1)
+        for info in infos:
+            self.assertEqual(info.user, self.user)
+
+    def test_access_names_timeout(self):
+        self.fs.touch("foo")
+        ssh = self.fs.delegate_fs()
+        ssh.platform, ssh.locale
+        ssh.invalidate_names()
+        # names are looked up individually when the listing times out
+        with utils.mock.patch.object(
+            ssh, '_exec_command', side_effect=[socket.timeout(), b"", b""]
+        ) as _exec_command:
+            info = self.fs.getinfo("foo", namespaces=["access"])
+            self.assertEqual(_exec_command.call_count, 3)
+        self.assertIsNone(info.user)
+        self.assertIsNone(info.group)
+        self.assertIsNotNone(info.uid)
+        # and only their numerical ids are used when the lookups fail too
+        ssh.invalidate_names()
+        with utils.mock.patch.object(
+            ssh, '_exec_command', side_effect=socket.timeout()
+        ):
+            info = self.fs.getinfo("foo", namespaces=["access"])
+        self.assertIsNone(info.user)
+        self.assertIsNotNone(info.uid)
+
+    def test_access_names_listing(self):
+        ssh = self.fs.delegate_fs()
+        ssh.invalidate_names()
+        # group entries are not mistaken for users when no user is listed
+        with utils.mock.patch.object(
+            ssh, '_exec_command', return_value=b"%%\nstaff:x:50:\n"
+        ):
+            names = ssh._list_names()
+        self.assertEqual(names, {'passwd': {}, 'group': {50: 'staff'}})
+        # and the commands are run without holding the names lock
+        outputs = [b"root:x:0:0::/root:/bin/sh\n%%\nwheel:x:0:", b""]
+        def _exec_command(cmd):
+            self.assertFalse(ssh._names_lock.locked())
+            return outputs.pop(0)
+        with utils.mock.patch.object(
+            ssh, '_exec_command', side_effect=_exec_command
+        ):
+            self.assertEqual(ssh._get_name('passwd', 0), 'root')
+            self.assertEqual(ssh._get_name('group', 0), 'wheel')
+            self.assertIsNone(ssh._get_name('group', 50))
+            self.assertIsNone(ssh._get_name('group', 50))
+        self.assertEqual(outputs, [])
+
+    def test_stat_cache(self):
+        self.fs.writebytes("foo", b"bar")
+        path = fs.path.join(self.test_folder, "foo")
+        with SSHFS('localhost', self.user, self.pasw, port=self.port, cache_ttl=60) as ssh_fs:
+            with utils.mock.patch.object(
+                ssh_fs._sftp, 'stat', wraps=ssh_fs._sftp.stat
+            ) as stat:
+                self.assertTrue(ssh_fs.isfile(path))
+                self.assertTrue(ssh_fs.exists(path))
+                self.assertEqual(ssh_fs.getsize(path), 3)
+                self.assertEqual(stat.call_count, 1)
+                # writing through the filesystem invalidates the cache
+                ssh_fs.writebytes(path, b"foobar")
+                self.assertEqual(ssh_fs.getsize(path), 6)
+                ssh_fs.remove(path)
+                self.assertFalse(ssh_fs.exists(path))
+                # listing a directory fills the cache
+                ssh_fs.writebytes(path, b"bar")
+                ssh_fs.invalidate_cache()
+                stat.reset_mock()
+                ssh_fs.listdir(self.test_folder)
+                list(ssh_fs.scandir(self.test_folder))
+                self.assertTrue(ssh_fs.isfile(path))
+                self.assertEqual(stat.call_count, 1)
+
+    def test_download_workers(self):
+        data = os.urandom(3 * 65536 + 123)
+        self.fs.writebytes("foo", data)
+        progress = []
+        with io.BytesIO() as handle:
+            handle.write(b"header")
+            self.fs.download(
+                "foo",
+                handle,
+                chunk_size=65536,
+                workers=4,
+                callback=lambda done, total: progress.append((done, total)),
+            )
+            self.assertEqual(handle.tell(), 6 + len(data))
+            self.assertEqual(handle.getvalue(), b"header" + data)
+        self.assertEqual(len(progress), 4)
+        self.assertEqual(progress[-1], (len(data), len(data)))
+        with self.assertRaises(fs.errors.ResourceNotFound):
+            self.fs.download("bar", io.BytesIO(), workers=4)
+
+    def test_upload_workers(self):
+        data = os.urandom(3 * 65536 + 123)
+        progress = []
+        with io.BytesIO(data) as handle:
+            self.fs.upload(
+                "foo",
+                handle,
+                chunk_size=65536,
+                workers=4,
+                file_size=len(data),
+                callback=lambda done, total: progress.append((done, total)),
+            )
+        self.assertEqual(self.fs.readbytes("foo"), data)
+        self.assertEqual(len(progress), 4)
+        self.assertEqual(progress[-1], (len(data), len(data)))
+        # overwriting a file truncates it first
+        with io.BytesIO(b"bar") as handle:
+            self.fs.upload("foo", handle, workers=4)
+        self.assertEqual(self.fs.readbytes("foo"), b"bar")
+        with self.assertRaises(fs.errors.ResourceNotFound):
+            self.fs.upload("bar/baz", io.BytesIO(data), workers=4)
+
+    def test_session(self):
+        ssh = self.fs.delegate_fs()
+        with ssh._session() as first:
+            self.assertIs(first, ssh._sftp)
+            # concurrent operations use sessions from the pool
+            with ssh._session() as second:
+                self.assertIsNot(second, ssh._sftp)
+        with ssh._session() as third:
+            self.assertIs(third, ssh._sftp)
+
+    def test_concurrent_operations(self):
+        names = ["file{}".format(i) for i in range(8)]
+
+        def roundtrip(name):
+            self.fs.writebytes(name, name.encode("ascii"))
+            self.assertTrue(self.fs.isfile(name))
+            return self.fs.readbytes(name)
+
+        with futures.ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(roundtrip, names))
+        self.assertEqual(results, [name.encode("ascii") for name in names])
+        self.assertEqual(sorted(self.fs.listdir("/")), names)
+
+    def test_copy_server_side(self):
+        data = os.urandom(65536)
+        self.fs.writebytes("foo", data)
+        self.fs.setinfo("foo", {"details": {"modified": 1500000000}})
+        self.fs.copy("foo", "bar", preserve_time=True)
+        self.assertEqual(self.fs.readbytes("bar"), data)
+        self.assertEqual(self.fs.getinfo("bar", ["details"]).modified.year, 2017)
+        self.fs.makedirs("dir/sub")
+        self.fs.writebytes("dir/sub/baz", data)
+        self.fs.copydir("dir", "copy", create=True)
+        self.assertEqual(self.fs.readbytes("copy/sub/baz"), data)
+        with self.assertRaises(fs.errors.DestinationExists):
+            self.fs.copy("foo", "bar")
+        with self.assertRaises(fs.errors.FileExpected):
+            self.fs.copy("dir", "qux")
+
+    def test_removetree_pipelined(self):
+        ssh = self.fs.delegate_fs()
+        self.fs.makedirs("foo/bar/baz")
+        self.fs.makedirs("foo/qux")
+        for path in ["foo/a", "foo/bar/b", "foo/bar/baz/c", "foo/qux/d"]:
+            self.fs.writetext(path, "data")
+        ssh._remove_pipelined(self.fs.delegate_path("foo")[1])
+        self.assertFalse(self.fs.exists("foo"))
+
+    def test_getinfo_many(self):
+        ssh = self.fs.delegate_fs()
+        self.fs.writebytes("foo", b"data")
+        self.fs.makedir("bar")
+        paths = [self.fs.delegate_path(p)[1] for p in ("foo", "baz", "bar")]
+        results = list(ssh.getinfo_many(paths, namespaces=["details"]))
+        self.assertEqual(results[0].name, "foo")
+        self.assertEqual(results[0].size, 4)
+        self.assertIsInstance(results[1], fs.errors.ResourceNotFound)
+        self.assertTrue(results[2].is_dir)
+        self.assertEqual(list(ssh.exists_many(paths)), [True, False, True])
+        # a broken session fails the batch with a filesystem error
+        with utils.mock.patch.object(
+            SFTPClient, 'pipeline', side_effect=paramiko.ssh_exception.SSHException()
+        ):
+            with self.assertRaises(fs.errors.RemoteConnectionError):
+                list(ssh.getinfo_many(paths))
+
+    def test_walk_find(self):
+        ssh = self.fs.delegate_fs()
+        self.assertIs(self.fs.walk.walker_class, ssh.walker_class)
+        self.fs.makedirs("foo/bar")
+        self.fs.writebytes("foo/bar/baz.txt", b"data")
+        self.fs.writebytes("qux", b"")
+        listing = ssh._find_tree(self.fs.delegate_path("/")[1], ["details"])
+        self.assertEqual(sorted(listing), ["", "foo", "foo/bar"])
+        self.assertEqual(listing["foo/bar"][0].name, "baz.txt")
+        self.assertEqual(listing["foo/bar"][0].size, 4)
+        self.assertEqual(
+            sorted(self.fs.walk.files()), ["/foo/bar/baz.txt", "/qux"]
+        )
+        self.assertEqual(sorted(self.fs.walk.dirs()), ["/foo", "/foo/bar"])
+        # walking a file fails as with the default walker
+        with self.assertRaises(fs.errors.DirectoryExpected):
+            list(self.fs.walk.files("qux"))
+        self.assertEqual(list(self.fs.walk.files("/foo/bar")), ["/foo/bar/baz.txt"])
+        self.fs.makedir("empty")
+        self.assertEqual(list(self.fs.walk.files("empty")), [])
+        self.assertEqual(
+            [match.path for match in self.fs.glob("**/*.txt")],
+            ["/foo/bar/baz.txt"],
+        )
+
+    def test_walk_depth_sessions(self):
+        self.fs.makedirs("/".join("dir{}".format(i) for i in range(12)))
+        with SSHFS(
+            'localhost', self.user, self.pasw, port=self.port,
+            timeout=2, pool_max_sessions=2,
+        ) as ssh_fs:
+            # a depth-first walk keeps a directory listing open per level
+            walker = fs.walk.Walker(search="depth")
+            dirs = list(walker.dirs(ssh_fs, self.test_folder))
+        self.assertEqual(len(dirs), 12)
+
+    def test_walk_find_large_output(self):
+        ssh = self.fs.delegate_fs()
+        remote = self.fs.delegate_path("/")[1]
+        # the listing is larger than the 2 MiB window of the channel
+        ssh._exec_command(
+            "cd {} && seq 10000 | sed 's/^/{}/' | xargs touch".format(remote, "x" * 200)
+        )
+        listing = ssh._find_tree(remote, ["details"])
+        self.assertEqual(len(listing[""]), 10000)
+        self.assertEqual(len(list(self.fs.walk.files())), 10000)
+        # the directories are scanned when the command fails
+        with utils.mock.patch.object(
+            ssh, '_exec_command', side_effect=socket.timeout()
+        ) as _exec_command:
+            self.assertEqual(len(list(self.fs.walk.files())), 10000)
+            _exec_command.assert_called()
+
+    def test_scandir_streaming(self):
+        names = ["file{:03}".format(i) for i in range(250)]
+        for name in names:
+            self.fs.create(name)
+        scan = self.fs.scandir("/", page=(10, 20))
+        self.assertEqual(len(list(scan)), 10)
+        # an abandoned scan must not break the following requests
+        scan = self.fs.scandir("/")
+        next(scan)
+        scan.close()
+        self.assertEqual(sorted(self.fs.listdir("/")), names)
+        self.assertEqual(
+            sorted(info.name for info in self.fs.scandir("/")), names
+        )
+
+    def test_openbin_block_cache(self):
+        data = os.urandom(100000) + b"foo\nbar\n"
+        self.fs.writebytes("foo", data)
+        with self.fs.openbin("foo", block_cache=65536, block_size=4096) as f:
+            for offset, size in [(50000, 10), (0, 5000), (49990, 30), (99999, 1)]:
+                f.seek(offset)
+                self.assertEqual(f.read(size), data[offset:offset+size])
+            f.seek(-8, 2)
+            self.assertEqual(f.readline(), b"foo\n")
+            self.assertEqual(f.readlines(), [b"bar\n"])
+            self.assertEqual(f.read(), b"")
+            f.seek(0)
+            self.assertEqual(f.read(), data)
+        # the size of the file is taken from the open handle
+        ssh = self.fs.delegate_fs()
+        with utils.mock.patch.object(ssh, 'getsize', wraps=ssh.getsize) as getsize:
+            with self.fs.openbin("foo", block_cache=65536) as f:
+                self.assertEqual(f.read(), data)
+            getsize.assert_not_called()
+
+    def test_openbin_readinto_write_views(self):
+        data = os.urandom(100000)
+        with self.fs.openbin("foo", "w") as f:
+            self.assertEqual(f.write(memoryview(data)[:50000]), 50000)
+            self.assertEqual(f.write(bytearray(data[50000:])), 50000)
+        with self.fs.openbin("foo", prefetch=False) as f:
+            buffer = bytearray(60000)
+            self.assertEqual(f.readinto(memoryview(buffer)), 60000)
+            self.assertEqual(buffer, data[:60000])
+            self.assertEqual(f.readinto(buffer), 40000)
+            self.assertEqual(buffer[:40000], data[60000:])
+            self.assertEqual(f.readinto(buffer), 0)
+            f.seek(0)
+            self.assertEqual(io.BufferedReader(f).read(), data)
+
+    def test_openbin_prefetch_window(self):
+        data = os.urandom(200000) + b"foo\nbar\n"
+        self.fs.writebytes("foo", data)
+        with self.fs.openbin("foo", prefetch_window=65536) as f:
+            self.assertEqual(f.read(100), data[:100])
+            self.assertEqual(f.read(), data[100:])
+            f.seek(-8, 2)
+            self.assertEqual(list(f), [b"foo\n", b"bar\n"])
+        with self.fs.openbin("foo", prefetch_range=(1000, 5000)) as f:
+            f.seek(1000)
+            self.assertEqual(f.read(10000), data[1000:11000])
+            f.seek(0)
+            self.assertEqual(f.read(), data)
+
+    def test_openbin_write_behind(self):
+        data = os.urandom(200000)
+        with self.fs.openbin("foo", "w", write_behind=65536) as f:
+            for i in range(0, len(data), 100):
+                self.assertEqual(f.write(data[i:i+100]), len(data[i:i+100]))
+            self.assertEqual(f.tell(), len(data))
+            f.flush()
+            self.assertEqual(self.fs.readbytes("foo"), data)
+            f.seek(10)
+            f.write(b"bar")
+        self.assertEqual(self.fs.readbytes("foo"), data[:10] + b"bar" + data[13:])
+        with self.fs.openbin("foo", "r+", write_behind=65536) as f:
+            f.write(b"baz")
+            self.assertEqual(f.read(7), data[3:10])
+        self.assertEqual(self.fs.readbytes("foo")[:13], b"baz" + data[3:10] + b"bar")
+
+    def test_share_transport(self):
+        kwargs = dict(port=self.port, share_transport=True)
+        path = fs.path.join(self.test_folder, "foo")
+        fs1 = SSHFS('localhost', self.user, self.pasw, **kwargs)
+        fs2 = SSHFS('localhost', self.user, self.pasw, **kwargs)
+        try:
+            client = fs1._client
+            self.assertIs(client, fs2._client)
+            transport = client.get_transport()
+            fs1.writetext(path, "bar")
+            fs1.close()
+            self.assertTrue(transport.is_active())
+            self.assertEqual(fs2.readtext(path), "bar")
+        finally:
+            fs1.close()
+            fs2.close()
+        self.assertFalse(transport.is_active())
+        fs3 = SSHFS('localhost', self.user, self.pasw, **kwargs)
+        with fs3:
+            self.assertIsNot(fs3._client, client)
+            fs3.remove(path)
+
+    def test_lazy(self):
+        ssh_fs = SSHFS('localhost', self.user, self.pasw, port=self.port, lazy=True)
+        path = fs.path.join(self.test_folder, "foo")
+        with ssh_fs:
+            self.assertIsNone(ssh_fs._connection)
+            ssh_fs.writetext(path, "bar")
+            self.assertIsNotNone(ssh_fs._connection)
+            self.assertEqual(ssh_fs.readtext(path), "bar")
+            ssh_fs.remove(path)
+        lazy_fs = SSHFS('localhost', self.user, "wrong", port=self.port, lazy=True)
+        with lazy_fs:
+            self.assertRaises(fs.errors.CreateFailed, lazy_fs.listdir, "/")
+
+    def test_reconnect(self):
+        ssh_fs = SSHFS('localhost', self.user, self.pasw, port=self.port, retry_delay=0)
+        path = fs.path.join(self.test_folder, "foo")
+        sftp_client = type(ssh_fs._sftp)
+
+        def disconnect(method, times=None):
+            calls = itertools.count()
+            def wrapper(sftp, *args, **kwargs):
+                if times is None or next(calls) < times:
+                    sftp.get_channel().get_transport().close()
+                return method(sftp, *args, **kwargs)
+            return wrapper
+
+        with ssh_fs:
+            ssh_fs.writetext(path, "bar")
+            # the connection is reopened when found closed
+            client = ssh_fs._client
+            client.get_transport().close()
+            self.assertEqual(ssh_fs.readtext(path), "bar")
+            self.assertIsNot(ssh_fs._client, client)
+            # idempotent operations are retried
+            stat = disconnect(sftp_client.stat, times=2)
+            with utils.mock.patch.object(sftp_client, 'stat', stat):
+                self.assertEqual(ssh_fs.getsize(path), 3)
+            # other operations are not
+            remove = disconnect(sftp_client.remove)
+            with utils.mock.patch.object(sftp_client, 'remove', remove):
+                self.assertRaises(fs.errors.RemoteConnectionError, ssh_fs.remove, path)
+            self.assertTrue(ssh_fs.exists(path))
+            ssh_fs.remove(path)
+
+    def test_download_resume(self):
+        data = os.urandom(3 * 65536 + 123)
+        self.fs.writebytes("foo", data)
+        progress = []
+        with io.BytesIO(data[:65536]) as handle:
+            self.fs.download(
+                "foo",
+                handle,
+                resume=True,
+                callback=lambda done, total: progress.append((done, total)),
+            )
+            self.assertEqual(handle.getvalue(), data)
+        self.assertEqual(progress[0], (65536, len(data)))
+        self.assertEqual(progress[-1], (len(data), len(data)))
+        # a local file larger than the remote one is downloaded again
+        with io.BytesIO(data + b"bar") as handle:
+            self.fs.download("foo", handle, resume=True, workers=4)
+            self.assertEqual(handle.getvalue(), data)
+        # so is a local file whose tail differs from the remote file
+        with io.BytesIO(data[:65530] + b"barbaz") as handle:
+            self.fs.download("foo", handle, resume=True, resume_check=4096)
+            self.assertEqual(handle.getvalue(), data)
+
+    def test_upload_resume(self):
+        data = os.urandom(3 * 65536 + 123)
+        self.fs.writebytes("foo", data[:65536])
+        progress = []
+        with io.BytesIO(data) as handle:
+            self.fs.upload(
+                "foo",
+                handle,
+                resume=True,
+                callback=lambda done, total: progress.append((done, total)),
+            )
+        self.assertEqual(self.fs.readbytes("foo"), data)
+        self.assertEqual(progress[0], (65536, len(data)))
+        self.assertEqual(progress[-1], (len(data), len(data)))
+        # a remote file larger than the local one is uploaded again
+        self.fs.writebytes("foo", data + b"bar")
+        with io.BytesIO(data) as handle:
+            self.fs.upload("foo", handle, resume=True)
+        self.assertEqual(self.fs.readbytes("foo"), data)
+        # so is a remote file whose tail differs from the local file
+        self.fs.writebytes("foo", data[:65530] + b"barbaz")
+        with io.BytesIO(data) as handle:
+            self.fs.upload("foo", handle, resume=True, resume_check=4096)
+        self.assertEqual(self.fs.readbytes("foo"), data)
+        # missing files are uploaded entirely
+        with io.BytesIO(data) as handle:
+            self.fs.upload("bar", handle, resume=True)
+        self.assertEqual(self.fs.readbytes("bar"), data)
+
+    def test_delta_transfer(self):
+        block_size = 65536
+        data = os.urandom(4 * block_size + 123)
+        changed = data[:block_size] + os.urandom(block_size) + data[2 * block_size:]
+        self.fs.writebytes("foo", data)
+        with io.BytesIO(changed) as handle:
+            self.fs.upload("foo", handle, delta=True, delta_block_size=block_size)
+        self.assertEqual(self.fs.readbytes("foo"), changed)
+        # a remote file larger than the local one is truncated
+        with io.BytesIO(changed[:-200]) as handle:
+            self.fs.upload("foo", handle, delta=True, delta_block_size=block_size)
+        self.assertEqual(self.fs.readbytes("foo"), changed[:-200])
+        # missing files are uploaded entirely
+        with io.BytesIO(data) as handle:
+            self.fs.upload("bar", handle, delta=True)
+        self.assertEqual(self.fs.readbytes("bar"), data)
+        # only the stale blocks of the local file are downloaded
+        with io.BytesIO(changed + b"baz") as handle:
+            self.fs.download("bar", handle, delta=True, delta_block_size=block_size)
+            self.assertEqual(handle.getvalue(), data)
+        # files are transferred entirely when they cannot be hashed
+        ssh = self.fs.delegate_fs()
+        with utils.mock.patch.object(
+            ssh, '_check_file', return_value=None
+        ), utils.mock.patch.object(
+            ssh, '_exec_command', side_effect=socket.timeout()
+        ) as _exec_command:
+            with io.BytesIO(changed) as handle:
+                self.fs.upload("bar", handle, delta=True, delta_block_size=block_size)
+            with io.BytesIO(data) as handle:
+                self.fs.download("bar", handle, delta=True, delta_block_size=block_size)
+                self.assertEqual(handle.getvalue(), changed)
+            _exec_command.assert_called()
+        self.assertEqual(self.fs.readbytes("bar"), changed)
+
+    def test_hash_server_side(self):
+        ssh = self.fs.delegate_fs()
+        data = os.urandom(65536)
+        self.fs.writebytes("foo", data)
+        self.fs.makedir("bar")
+        self.assertEqual(self.fs.hash("foo", "sha256"), hashlib.sha256(data).hexdigest())
+        self.assertEqual(self.fs.hash("foo", "md5"), hashlib.md5(data).hexdigest())
+        self.assertRaises(fs.errors.UnsupportedHash, self.fs.hash, "foo", "foo")
+        paths = [self.fs.delegate_path(p)[1] for p in ("foo", "baz", "bar")]
+        results = list(ssh.hash_many(paths, "sha1"))
+        self.assertEqual(results[0], hashlib.sha1(data).hexdigest())
+        self.assertIsInstance(results[1], fs.errors.ResourceNotFound)
+        self.assertIsInstance(results[2], fs.errors.FileExpected)
+        # the hash namespace
+        digest = hashlib.sha256(data).hexdigest()
+        self.assertEqual(self.fs.getinfo("foo", ["hash"]).get("hash", "sha256"), digest)
+        self.assertIsNone(self.fs.getinfo("bar", ["hash"]).get("hash", "sha256"))
+        hashes = {
+            info.name: info.get("hash", "sha256")
+            for info in self.fs.scandir("/", namespaces=["hash"])
+        }
+        self.assertEqual(hashes, {"foo": digest, "bar": None})
+
+    def test_hash_check_file(self):
+        ssh = self.fs.delegate_fs()
+        data = os.urandom(3000)
+        self.fs.writebytes("foo", data)
+        path = self.fs.delegate_path("foo")[1]
+        digests = [hashlib.md5(data[i:i+1024]).digest() for i in range(0, 3000, 1024)]
+
+        def reply(algorithm, digest):
+            msg = paramiko.Message()
+            msg.add_string("check-file")
+            msg.add_string(algorithm)
+            msg.add_bytes(digest)
+            msg.rewind()
+            return paramiko.sftp.CMD_EXTENDED_REPLY, msg
+
+        # pretend the server advertises the extension
+        with utils.mock.patch.dict(ssh._sftp.extensions, {"check-file": b"md5,sha1"}):
+            with utils.mock.patch.object(
+                SFTPClient, "send", return_value=1
+            ) as send, utils.mock.patch.object(
+                SFTPClient, "receive", return_value=reply("md5", b"".join(digests))
+            ):
+                self.assertEqual(ssh._block_hashes(path, 1024), digests)
+                send.assert_called_with(
+                    paramiko.sftp.CMD_EXTENDED,
+                    "check-file-name",
+                    path,
+                    "md5",
+                    paramiko.sftp.int64(0),
+                    paramiko.sftp.int64(0),
+                    1024,
+                )
+            # digests computed with another algorithm are ignored
+            with utils.mock.patch.object(
+                SFTPClient, "send", return_value=1
+            ), utils.mock.patch.object(
+                SFTPClient, "receive", return_value=reply("sha1", digests[0])
+            ):
+                self.assertIsNone(ssh._check_file(path, "md5"))
+
+    def test_sync(self):
+        ssh = self.fs.delegate_fs()
+        remote = self.fs.delegate_path("/")[1]
+        with fs.open_fs("mem://") as local:
+            local.makedirs("foo/bar")
+            local.writebytes("foo/bar/baz", b"baz")
+            local.writebytes("qux", b"qux")
+            stats = ssh.sync_from(local, "/", remote, dry_run=True)
+            self.assertEqual(stats.created, 2)
+            self.assertEqual(stats.directories, 2)
+            self.assertFalse(self.fs.exists("qux"))
+            # files are copied with the transfers of the remote filesystem
+            with utils.mock.patch.object(ssh, 'upload', wraps=ssh.upload) as upload:
+                stats = ssh.sync_from(local, "/", remote)
+                self.assertEqual(upload.call_count, 2)
+            self.assertEqual(stats.transferred, 6)
+            self.assertEqual(self.fs.readbytes("foo/bar/baz"), b"baz")
+            # unchanged files are not copied again
+            stats = ssh.sync_from(local, "/", remote)
+            self.assertEqual(stats.actions, [])
+            self.assertEqual(stats.unchanged, 2)
+            # changed and extraneous files
+            local.writebytes("qux", b"quux")
+            self.fs.writebytes("extra", b"extra")
+            stats = ssh.sync_from(local, "/", remote, delete=True)
+            self.assertEqual(stats.actions, [("remove", "extra"), ("update", "qux")])
+            self.assertEqual(self.fs.readbytes("qux"), b"quux")
+            self.assertFalse(self.fs.exists("extra"))
+            self.assertEqual(ssh.sync_from(local, "/", remote, checksum=True).unchanged, 2)
+        with fs.open_fs("mem://") as local:
+            with utils.mock.patch.object(ssh, 'download', wraps=ssh.download) as download:
+                stats = ssh.sync_to(local, remote, "/")
+                self.assertEqual(download.call_count, 2)
+            self.assertEqual(stats.created, 2)
+            self.assertEqual(local.readbytes("foo/bar/baz"), b"baz")
+            self.assertEqual(ssh.sync_to(local, remote, "/").unchanged, 2)
+
+    def test_sync_large_tree(self):
+        ssh = self.fs.delegate_fs()
+        remote = self.fs.delegate_path("/")[1]
+        # the listing of the tree is larger than the window of the channel
+        ssh._exec_command(
+            "cd {} && seq 10000 | sed 's/^/{}/' | xargs touch".format(remote, "x" * 200)
+        )
+        with fs.open_fs("mem://") as local:
+            stats = ssh.sync_to(local, remote, "/", dry_run=True)
+            self.assertEqual(stats.created, 10000)
+            with utils.mock.patch.object(
+                ssh, '_exec_command', side_effect=socket.timeout()
+            ):
+                stats = ssh.sync_to(local, remote, "/", dry_run=True)
+            self.assertEqual(stats.created, 10000)
+
+    def test_batch(self):
+        ssh = self.fs.delegate_fs()
+        path = lambda p: self.fs.delegate_path(p)[1]
+        batch = ssh.batch(workers=4)
+        results = batch.makedir([path("foo/bar"), path("foo"), path("baz/qux")])
+        self.assertEqual(results[:2], [None, None])
+        self.assertIsInstance(results[2], fs.errors.ResourceNotFound)
+        self.assertTrue(self.fs.isdir("foo/bar"))
+
+        names = ["foo/file{}".format(i) for i in range(20)]
+        for name in names:
+            self.fs.writetext(name, name)
+        contents = batch.readbytes([path(name) for name in names] + [path("foo/bar")])
+        self.assertEqual(contents[:-1], [name.encode("utf-8") for name in names])
+        self.assertIsInstance(contents[-1], fs.errors.FileExpected)
+
+        results = batch.setinfo([
+            (path(names[0]), {"details": {"modified": 1000000}}),
+            (path("missing"), {"details": {"modified": 1000000}}),
+        ])
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], fs.errors.ResourceNotFound)
+        self.assertEqual(self.fs.getinfo(names[0], ["details"]).raw["details"]["modified"], 1000000)
+
+        results = batch.move([(path(names[0]), path("moved")), (path(names[1]), path(names[2]))])
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], fs.errors.DestinationExists)
+        self.assertEqual(self.fs.readtext("moved"), names[0])
+
+        results = batch.remove([path(name) for name in names[1:]] + [path("foo/bar"), path("missing")])
+        self.assertEqual(results[:-2], [None] * (len(names) - 1))
+        self.assertIsInstance(results[-2], fs.errors.FileExpected)
+        self.assertIsInstance(results[-1], fs.errors.ResourceNotFound)
+        self.assertEqual(self.fs.listdir("foo"), ["bar"])
+
+    @unittest.skipIf(sys.version_info < (3, 5), "requires Python 3.5+")
+    def test_async(self):
+        import asyncio
+        from fs.sshfs import AsyncSSHFS
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.addCleanup(loop.close)
+        run = loop.run_until_complete
+
+        async_fs = AsyncSSHFS("localhost", self.user, self.pasw, port=self.port)
+        self.addCleanup(lambda: run(async_fs.close()))
+        folder = fs.path.join(self.test_folder, "foo")
+        run(async_fs.makedir(folder))
+        self.assertTrue(self.fs.isdir("foo"))
+
+        data = os.urandom(100000)
+        names = ["file{}".format(i) for i in range(100)]
+        paths = [fs.path.join(folder, name) for name in names]
+        run(asyncio.gather(*(async_fs.writebytes(path, data) for path in paths)))
+        self.assertEqual(self.fs.readbytes("foo/file0"), data)
+        self.assertEqual(run(async_fs.readbytes(paths[-1])), data)
+        infos = run(asyncio.gather(*(async_fs.getinfo(path, ["details"]) for path in paths)))
+        self.assertEqual({info.size for info in infos}, {len(data)})
+        self.assertEqual(sorted(run(async_fs.listdir(folder))), sorted(names))
+
+        with io.BytesIO() as handle:
+            run(async_fs.download(paths[0], handle))
+            self.assertEqual(handle.getvalue(), data)
+        with io.BytesIO(data[::-1]) as handle:
+            run(async_fs.upload(paths[0], handle))
+        self.assertEqual(self.fs.readbytes("foo/file0"), data[::-1])
+
+        run(async_fs.remove(paths[0]))
+        self.assertFalse(self.fs.exists("foo/file0"))
+        self.assertRaises(fs.errors.ResourceNotFound, run, async_fs.getinfo(paths[0]))
+        self.assertRaises(fs.errors.FileExpected, run, async_fs.remove(folder))
+        self.assertRaises(fs.errors.DirectoryExists, run, async_fs.makedir(folder))
+        self.assertRaises(fs.errors.DirectoryExpected, run, async_fs.scandir(paths[1]))
+
+        # requests are sent outside of the event loop, which must not block
+        # when the window of the channel is full
+        threads = set()
+        send = SFTPClient.send
+
+        def record(sftp, *args):
+            threads.add(threading.current_thread())
+            return send(sftp, *args)
+
+        with utils.mock.patch.object(SFTPClient, "send", record):
+            run(async_fs.writebytes(paths[1], os.urandom(4 * 1024 * 1024)))
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_tar_command_warnings(self):
+        ssh = self.fs.delegate_fs()
+        remote = self.fs.delegate_path("/")[1]
+        self.fs.writebytes("foo", b"foo")
+        # warnings larger than the window of the channel precede the archive
+        cmd = "head -c 3000000 /dev/zero >&2; tar -cf - -C {} .".format(remote)
+        with fs.open_fs("mem://") as local:
+            ssh._tar_command(
+                cmd,
+                lambda stdin, stdout: read_tree(stdout, local, "/"),
+                "download_tree",
+                remote,
+            )
+            self.assertEqual(local.readbytes("foo"), b"foo")
+
+    def test_transfer_tree(self):
+        ssh = self.fs.delegate_fs()
+        remote = self.fs.delegate_path("/")[1]
+        with fs.open_fs("mem://") as local:
+            local.makedirs("foo/bar")
+            local.writebytes("foo/bar/baz", b"baz")
+            local.writebytes("foo/empty", b"")
+            local.writebytes("qux", b"qux")
+            local.setinfo("qux", {"details": {"modified": 1000000}})
+            ssh.upload_tree(local, "/", fs.path.join(remote, "up"))
+            self.assertEqual(self.fs.readbytes("up/foo/bar/baz"), b"baz")
+            self.assertEqual(self.fs.readbytes("up/foo/empty"), b"")
+            self.assertEqual(self.fs.getinfo("up/qux", ["details"]).raw["details"]["modified"], 1000000)
+            self.assertRaises(
+                fs.errors.DirectoryExpected,
+                ssh.upload_tree, local, "qux", remote)
+            self.assertRaises(
+                ValueError,
+                ssh.upload_tree, local, "/", remote, compression="zip")
+        for compression in (None, "gz"):
+            with fs.open_fs("mem://") as local:
+                ssh.download_tree(
+                    local, fs.path.join(remote, "up"), "down", compression=compression)
+                self.assertEqual(
+                    sorted(local.walk.files()),
+                    ["/down/foo/bar/baz", "/down/foo/empty", "/down/qux"])
+                self.assertEqual(local.readbytes("down/qux"), b"qux")
+                self.assertEqual(local.getinfo("down/qux", ["details"]).raw["details"]["modified"], 1000000)